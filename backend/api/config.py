@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -14,6 +15,39 @@ CONNECTION_STRING = (
     f"postgresql+psycopg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 )
 
+# Largest page size of keyset-paginated endpoints
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "10000"))
+
+# Cache-Control policies of the read endpoints. Responses carry an ETag of the dataset version,
+# so "no-cache" lets browsers and proxies store them but revalidate with a cheap conditional request.
+CACHE_CONTROL = {
+    "biomarkers": os.getenv("CACHE_CONTROL_BIOMARKERS", "public, no-cache"),
+    "cdm": os.getenv("CACHE_CONTROL_CDM", "public, no-cache"),
+    "cohorts": os.getenv("CACHE_CONTROL_COHORTS", "public, no-cache"),
+    "longitudinal": os.getenv("CACHE_CONTROL_LONGITUDINAL", "public, no-cache"),
+    "visualization": os.getenv("CACHE_CONTROL_VISUALIZATION", "public, no-cache"),
+}
+
+# Largest accepted upload in bytes, and the size of the chunks uploads are spooled to disk in
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(4 * 1024**3)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024**2)))
+
+# Directory uploads are spooled to until their import job succeeded, must be shared with separate workers
+IMPORT_SPOOL_DIR = os.getenv("IMPORT_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "pdataviewer-uploads"))
+
+# Import workers: whether the API process runs one, how often idle workers poll for queued jobs (seconds),
+# and after how many seconds without progress a running job is assumed abandoned and claimed again
+IMPORT_WORKER_IN_PROCESS = os.getenv("IMPORT_WORKER_IN_PROCESS", "true").lower() == "true"
+IMPORT_WORKER_POLL_INTERVAL = float(os.getenv("IMPORT_WORKER_POLL_INTERVAL", "2"))
+IMPORT_JOB_STALE_AFTER = float(os.getenv("IMPORT_JOB_STALE_AFTER", "3600"))
+
+# Number of measurement files of an archive imported concurrently. Each holds a pooled connection, so keep it well
+# below the pool size of 10 (+20 overflow) to leave connections for reads.
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "4"))
+
+# Directory the reports of rows rejected by imports are written to
+IMPORT_REPORT_DIR = os.getenv("IMPORT_REPORT_DIR", os.path.join(tempfile.gettempdir(), "pdataviewer-imports"))
+
 # Keycloak Auth
 KEYCLOAK_URL = os.getenv("KEYCLOAK_URL", "http://localhost:8080")
 KEYCLOAK_REALM = os.getenv("KEYCLOAK_REALM", "myrealm")
@@ -1,6 +1,9 @@
+import hashlib
+from typing import Annotated, Optional
+
 import jwt
 from database.postgresql import PostgreSQLRepository
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt import PyJWKClient
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
@@ -11,6 +14,8 @@ from api.config import (
     KEYCLOAK_CLIENT_ID,
     KEYCLOAK_ISSUER,
 )
+from api.model import DataFormat
+from api.responses import ARROW_STREAM_MEDIA_TYPE, PARQUET_MEDIA_TYPE
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{KEYCLOAK_ISSUER}/protocol/openid-connect/token")
 jwks_client = PyJWKClient(KEYCLOAK_CERTS_URL)
@@ -44,3 +49,40 @@ async def get_client():
     session = AsyncSessionLocal()
     async with PostgreSQLRepository(session=session, engine=engine) as client:
         yield client
+
+
+def get_data_format(format: Optional[DataFormat] = None, accept: Annotated[Optional[str], Header()] = None):
+    """Negotiates the response format. An explicit `format` parameter takes precedence over the Accept header"""
+    if format is not None:
+        return format
+    if accept and ARROW_STREAM_MEDIA_TYPE in accept:
+        return DataFormat.ARROW
+    if accept and PARQUET_MEDIA_TYPE in accept:
+        return DataFormat.PARQUET
+    return DataFormat.JSON
+
+
+def conditional_get(cache_control: str):
+    """Creates a dependency that tags responses with an ETag of the dataset version.
+
+    Requests whose If-None-Match header matches are answered with 304 before the endpoint runs. The data
+    generation is served from the process-local copy, so a revalidation usually runs no query at all.
+    """
+
+    async def check_etag(
+        request: Request, response: Response, database: Annotated[PostgreSQLRepository, Depends(get_client)]
+    ):
+        generation = await database.get_data_generation()
+        representation = f"{request.url.path}?{request.url.query}|{request.headers.get('accept', '')}"
+        etag = f'"{generation}-{hashlib.sha256(representation.encode()).hexdigest()[:16]}"'
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if etag in candidates or "*" in candidates:
+                raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        response.headers.update(headers)
+
+    return check_etag
@@ -1,6 +1,7 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
-from database.models import Base
+from database.models import create_schema
 from fastapi import FastAPI
 from fastapi.responses import RedirectResponse
 from starlette.middleware.cors import CORSMiddleware
@@ -10,10 +11,12 @@ from api.config import (
     APP_TITLE,
     APP_VERSION,
     CONTACT_INFO,
+    IMPORT_WORKER_IN_PROCESS,
     LICENSE_INFO,
     SWAGGER_UI_OAUTH_CONFIG,
 )
 from api.dependencies import engine
+from api.responses import NEXT_CURSOR_HEADER
 from api.routers import (
     biomarkers,
     cdm,
@@ -23,13 +26,20 @@ from api.routers import (
     stupdypicker,
     visualization,
 )
+from api.tasks.worker import run_worker
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(create_schema)
+    # Imports are processed by a worker in this process unless separate workers run `python -m api.tasks.worker`
+    worker = asyncio.create_task(run_worker()) if IMPORT_WORKER_IN_PROCESS else None
     yield
+    if worker:
+        worker.cancel()
+        with suppress(asyncio.CancelledError):
+            await worker
     await engine.dispose()
 
 
@@ -47,7 +57,12 @@ app = FastAPI(
 origins = ["https://pdata.scai.fraunhofer.de", "http://localhost:4200"]
 
 app.add_middleware(
-    CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=["*"], allow_headers=["*"]
+    CORSMiddleware,
+    allow_origins=origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
 
@@ -1,5 +1,7 @@
+from datetime import datetime
 from enum import Enum
 from typing import Optional
+from uuid import UUID
 
 from pydantic import BaseModel
 
@@ -24,8 +26,62 @@ class LongitudinalData(BaseModel):
     totalPatientCount: int
 
 
+class Histogram(BaseModel):
+    edges: list[float]
+    counts: list[int]
+
+
+class KernelDensity(BaseModel):
+    x: list[float]
+    density: list[float]
+    bandwidth: float
+
+
+class BiomarkerDistribution(BaseModel):
+    count: int
+    mean: Optional[float]
+    std: Optional[float]
+    min: Optional[float]
+    max: Optional[float]
+    q1: Optional[float]
+    median: Optional[float]
+    q3: Optional[float]
+    lowerWhisker: Optional[float]
+    upperWhisker: Optional[float]
+    outliers: int
+    histogram: Histogram
+    kde: Optional[KernelDensity]
+
+
+class DataFormat(str, Enum):
+    JSON = "json"
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
+
 class UploadType(str, Enum):
     LONGITUDINAL = "longitudinal"
     BIOMARKERS = "biomarkers"
     METADATA = "metadata"
     CDM = "cdm"
+
+
+class ImportJobStatus(BaseModel):
+    id: UUID
+    uploadType: UploadType
+    filename: str
+    rebuild: bool
+    status: str
+    progress: Optional[str]
+    currentFile: Optional[str]
+    filesDone: int
+    filesSkipped: int
+    filesTotal: Optional[int]
+    rowsProcessed: int
+    rowsRejected: int
+    rowsPerSecond: Optional[float]
+    attempts: int
+    error: Optional[str]
+    createdAt: datetime
+    startedAt: Optional[datetime]
+    finishedAt: Optional[datetime]
@@ -0,0 +1,91 @@
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Mapping, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+from api.model import DataFormat
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+async def _ndjson_chunks(rows: AsyncIterable[Any], batch_size: int) -> AsyncIterator[str]:
+    """Encode rows as newline-delimited JSON, grouping `batch_size` lines per chunk."""
+    lines = []
+    async for row in rows:
+        lines.append(json.dumps(row))
+        if len(lines) >= batch_size:
+            yield "\n".join(lines) + "\n"
+            lines.clear()
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def ndjson_response(
+    rows: AsyncIterable[Any], headers: Optional[Mapping[str, str]] = None, batch_size: int = 500
+) -> StreamingResponse:
+    """Stream rows to the client as newline-delimited JSON while they are fetched.
+
+    :param rows: Asynchronous iterable of JSON-serializable rows.
+    :param headers: Optional response headers, e.g. those set by dependencies on the injected response.
+    :param batch_size: Number of lines sent per chunk, defaults to 500.
+    :return: A streaming response with one JSON document per line.
+    """
+    return StreamingResponse(_ndjson_chunks(rows, batch_size), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+
+def rows_response(
+    rows: list[Mapping[str, Any]], model: type[BaseModel], headers: Optional[Mapping[str, str]] = None
+) -> JSONResponse:
+    """Serialize trusted database rows as a JSON array of the fields of a response model.
+
+    Returning the response directly skips the per-row validation of `response_model`, which remains on the
+    route for the documentation. Rows must already hold JSON-compatible values of the model's field types.
+
+    :param rows: Rows containing at least the fields of the model.
+    :param model: Response model whose fields are serialized, in declaration order.
+    :param headers: Optional response headers, e.g. those set by dependencies on the injected response.
+    :return: A JSON response with one object per row.
+    """
+    fields = tuple(model.model_fields)
+    return JSONResponse([{field: row[field] for field in fields} for row in rows], headers=headers)
+
+
+def set_next_cursor(response: Response, ids: list[int], limit: int | None):
+    """Expose the keyset cursor of the next page if the current page is full.
+
+    :param response: Response to add the cursor header to.
+    :param ids: Ids of the rows of the current page.
+    :param limit: Requested page size.
+    """
+    if limit is not None and len(ids) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = str(ids[-1])
+
+
+def table_response(
+    table: pa.Table, data_format: DataFormat, headers: Optional[Mapping[str, str]] = None
+) -> Response:
+    """Serialize an Arrow table as an Arrow IPC stream or a Parquet file.
+
+    :param table: Table to send.
+    :param data_format: Either `DataFormat.ARROW` or `DataFormat.PARQUET`.
+    :param headers: Optional response headers, e.g. those set by dependencies on the injected response.
+    :return: A response with the binary columnar payload.
+    """
+    sink = pa.BufferOutputStream()
+    if data_format == DataFormat.PARQUET:
+        pq.write_table(table, sink)
+        media_type = PARQUET_MEDIA_TYPE
+    else:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        media_type = ARROW_STREAM_MEDIA_TYPE
+    return Response(
+        content=sink.getvalue().to_pybytes(), media_type=media_type, headers={"Vary": "Accept", **(headers or {})}
+    )
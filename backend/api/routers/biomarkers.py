@@ -1,11 +1,20 @@
-from typing import Annotated
+from itertools import groupby
+from operator import itemgetter
+from typing import Annotated, Optional
 
-from database.postgresql import PostgreSQLRepository
-from fastapi import APIRouter, Depends
+from database.postgresql import EmptyRangeError, PostgreSQLRepository
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 
-from api.dependencies import get_client
+from api.config import CACHE_CONTROL, MAX_PAGE_SIZE
+from api.dependencies import conditional_get, get_client, get_data_format
+from api.model import BiomarkerDistribution, DataFormat
+from api.responses import ndjson_response, set_next_cursor, table_response
 
-router = APIRouter(prefix="/biomarkers", tags=["biomarkers"])
+router = APIRouter(
+    prefix="/biomarkers",
+    tags=["biomarkers"],
+    dependencies=[Depends(conditional_get(CACHE_CONTROL["biomarkers"]))],
+)
 
 
 @router.get("/")
@@ -24,23 +33,38 @@ async def get_biomarker_cohorts(biomarker: str, database: Annotated[PostgreSQLRe
     return await database.get_cohorts_for_biomarker(biomarker)
 
 
-@router.get("/diagnoses")
+def _diagnosis_labels(cohort_diagnoses: list[tuple[str, str, str]], biomarkers: list[str]) -> dict[str, list[str]]:
+    """Label the diagnoses of every cohort per biomarker, adding "Complete" to cohorts with several diagnoses."""
+    diagnoses: dict[str, list[str]] = {b: [] for b in biomarkers}
+    for (variable, cohort), rows in groupby(cohort_diagnoses, key=itemgetter(0, 1)):
+        cohort_labels = [f"{cohort} ({diagnosis} Group)" for _, _, diagnosis in rows]
+        diagnoses[variable].extend(cohort_labels)
+        if len(cohort_labels) > 1:
+            diagnoses[variable].append(f"{cohort} (Complete)")
+    return diagnoses
+
+
+@router.get("/diagnoses", response_model=list[str])
 async def get_cohort_biomarkers(biomarker: str, database: Annotated[PostgreSQLRepository, Depends(get_client)]):
     """
     Retrieve all unique diagnoses per cohort for the given biomarker.
     If multiple diagnoses exist in a cohort, add "Complete".
     """
-    diagnoses = []
+    cohort_diagnoses = await database.get_cohort_diagnoses_for_biomarkers([biomarker])
+    return _diagnosis_labels(cohort_diagnoses, [biomarker])[biomarker]
 
-    cohorts = await database.get_cohorts_for_biomarker(biomarker)
-    for cohort in cohorts:
-        cohort_diagnoses = await database.get_diagnoses_for_biomarker_in_cohort(biomarker, cohort)
-        for diagnosis in cohort_diagnoses:
-            diagnoses.append(f"{cohort} ({diagnosis} Group)")
-        if len(cohort_diagnoses) > 1:
-            diagnoses.append(f"{cohort} (Complete)")
 
-    return diagnoses
+@router.get("/diagnoses/batch", response_model=dict[str, list[str]])
+async def get_cohort_biomarkers_batch(
+    biomarker: Annotated[list[str], Query()],
+    database: Annotated[PostgreSQLRepository, Depends(get_client)],
+):
+    """
+    Retrieve the diagnoses per cohort like `/diagnoses` for several biomarkers at once.
+    The parameter is repeated for every biomarker, the diagnoses are returned per biomarker.
+    """
+    cohort_diagnoses = await database.get_cohort_diagnoses_for_biomarkers(biomarker)
+    return _diagnosis_labels(cohort_diagnoses, biomarker)
 
 
 @router.get("/cohorts/{cohort}/diagnoses/{diagnosis}", tags=["biomarkers"])
@@ -48,14 +72,69 @@ async def get_filtered_data(
     biomarker: str,
     cohort: str,
     diagnosis: str,
+    response: Response,
     database: Annotated[PostgreSQLRepository, Depends(get_client)],
+    data_format: Annotated[DataFormat, Depends(get_data_format)],
+    cursor: Annotated[Optional[int], Query(ge=0)] = None,
+    limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+    stream: bool = False,
 ):
     """
-    Filter biomarker data based on the chosen diagnosis type
+    Filter biomarker data based on the chosen diagnosis type.
+    With `limit`, the measurements are returned in pages; a full page sets the `X-Next-Cursor` header,
+    which is passed as `cursor` to fetch the next page.
+    With `stream`, the values are streamed as newline-delimited JSON.
+    With `format=arrow`/`format=parquet` or the matching Accept header, the `id` and `measurement` columns
+    are returned as an Arrow IPC stream or a Parquet file.
     """
-    if diagnosis == "Complete":
-        biomarker_data = await database.get_biomarker_measurements(biomarker, cohort, None)
-    else:
-        biomarker_data = await database.get_biomarker_measurements(biomarker, cohort, diagnosis)
+    diagnosis_filter = None if diagnosis == "Complete" else diagnosis
+
+    if data_format != DataFormat.JSON:
+        table = await database.export_biomarker_measurements(biomarker, cohort, diagnosis_filter, cursor, limit)
+        return table_response(table, data_format, response.headers)
+
+    if stream:
+        values = await database.stream_biomarker_values(biomarker, cohort, diagnosis_filter, cursor, limit)
+        return ndjson_response(values, response.headers)
 
+    biomarker_data = await database.get_biomarker_measurements(biomarker, cohort, diagnosis_filter, cursor, limit)
+    set_next_cursor(response, [bd.id for bd in biomarker_data], limit)
     return [bd.measurement for bd in biomarker_data]
+
+
+@router.get(
+    "/cohorts/{cohort}/diagnoses/{diagnosis}/distribution",
+    response_model=BiomarkerDistribution,
+    tags=["biomarkers"],
+)
+async def get_filtered_distribution(
+    biomarker: str,
+    cohort: str,
+    diagnosis: str,
+    database: Annotated[PostgreSQLRepository, Depends(get_client)],
+    bins: Annotated[int, Query(ge=1, le=500)] = 30,
+    lower: Optional[float] = None,
+    upper: Optional[float] = None,
+    kde: bool = False,
+    kde_points: Annotated[int, Query(ge=2, le=1024)] = 128,
+):
+    """
+    Summarize the biomarker distribution for the chosen diagnosis type.
+    Returns quartiles, whiskers, mean and standard deviation, a histogram with `bins` bins between `lower`
+    and `upper` (defaulting to the data range) and, if `kde` is set, a kernel density estimate.
+    """
+    if lower is not None and upper is not None and lower >= upper:
+        raise HTTPException(status_code=422, detail="'lower' must be smaller than 'upper'.")
+
+    try:
+        return await database.get_biomarker_distribution(
+            biomarker,
+            cohort,
+            None if diagnosis == "Complete" else diagnosis,
+            bins=bins,
+            lower=lower,
+            upper=upper,
+            kde_points=kde_points if kde else None,
+        )
+    except EmptyRangeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
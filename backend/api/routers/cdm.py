@@ -4,9 +4,14 @@ from database.models import ConceptSource
 from database.postgresql import PostgreSQLRepository
 from fastapi import APIRouter, Depends
 
-from api.dependencies import get_client
+from api.config import CACHE_CONTROL
+from api.dependencies import conditional_get, get_client
 
-router = APIRouter(prefix="/cdm", tags=["cdm"])
+router = APIRouter(
+    prefix="/cdm",
+    tags=["cdm"],
+    dependencies=[Depends(conditional_get(CACHE_CONTROL["cdm"]))],
+)
 
 
 @router.get("/variables", description="Get all variables available in PASSIONATE.")
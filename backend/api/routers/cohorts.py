@@ -3,10 +3,15 @@ from typing import Annotated
 from database.postgresql import PostgreSQLRepository
 from fastapi import APIRouter, Depends
 
-from api.dependencies import get_client
+from api.config import CACHE_CONTROL
+from api.dependencies import conditional_get, get_client
 from api.model import CohortMetadata
 
-router = APIRouter(prefix="/cohorts", tags=["cohorts"])
+router = APIRouter(
+    prefix="/cohorts",
+    tags=["cohorts"],
+    dependencies=[Depends(conditional_get(CACHE_CONTROL["cohorts"]))],
+)
 
 
 @router.get("/", description="Get all cohort names")
@@ -1,41 +1,153 @@
+from pathlib import Path
 from typing import Annotated
+from uuid import UUID, uuid4
 
+from database.models import ImportJob, ImportStatus
 from database.postgresql import PostgreSQLRepository
-from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import FileResponse
 
 from api.dependencies import get_client, get_current_user_payload
-from api.model import UploadType
-from api.tasks.import_tasks import process_import_background
+from api.model import ImportJobStatus, UploadType
+from api.tasks.import_tasks import rejected_report_path, spool_upload
+from api.tasks.worker import notify_worker
 
 router = APIRouter(prefix="/database", tags=["database"])
 
 
-@router.post("/import", description="Import data from a ZIP or CSV file into the database.")
+@router.post(
+    "/import",
+    description="Import data from a ZIP or CSV file into the database. Files unchanged since their last import are "
+    "skipped, changed files replace the previously imported data of their variable or modality.",
+)
 async def import_data(
     user: Annotated[dict, Depends(get_current_user_payload)],
-    background_tasks: BackgroundTasks,
+    database: Annotated[PostgreSQLRepository, Depends(get_client)],
     upload_type: UploadType,
     file: UploadFile = File(...),
+    use_copy: bool = Query(True, description="Bulk load measurements through COPY instead of INSERT statements."),
+    rebuild: bool = Query(
+        False,
+        description="Replace all data of the upload type with the upload. The data is loaded next to the live data, "
+        "which keeps being served until it is swapped in at once.",
+    ),
 ):
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file uploaded.")
 
-    contents = await file.read()
-
     is_zip = file.filename.endswith(".zip")
     is_csv = file.filename.endswith(".csv")
 
     if not (is_zip or is_csv):
         raise HTTPException(status_code=400, detail="Invalid file type. Only .zip or .csv files are accepted.")
 
-    background_tasks.add_task(process_import_background, contents, file.filename, upload_type)
-    return {"message": f"Import of {upload_type.value} started in the background."}
+    if rebuild and upload_type == UploadType.METADATA:
+        # All other data references the cohorts, which are therefore updated in place
+        raise HTTPException(status_code=400, detail="Metadata cannot be rebuilt, it is updated by regular imports.")
+
+    path = await spool_upload(file)
+
+    import_id = uuid4()
+    await database.create_import_job(import_id, upload_type.value, file.filename, str(path), use_copy, rebuild)
+    notify_worker()
+    return {"message": f"Import of {upload_type.value} queued.", "importId": str(import_id)}
 
 
-@router.delete("/delete", description="Delete all tables from the database.")
+@router.get(
+    "/import/{import_id}",
+    response_model=ImportJobStatus,
+    description="Retrieve the status and progress of an import job.",
+)
+async def get_import_job(
+    user: Annotated[dict, Depends(get_current_user_payload)],
+    database: Annotated[PostgreSQLRepository, Depends(get_client)],
+    import_id: UUID,
+):
+    job = await database.get_import_job(import_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found.")
+    return _job_status(job)
+
+
+@router.post(
+    "/import/{import_id}/retry",
+    response_model=ImportJobStatus,
+    description="Queue a failed import job again. Files imported by the failed attempt are skipped as unchanged.",
+)
+async def retry_import_job(
+    user: Annotated[dict, Depends(get_current_user_payload)],
+    database: Annotated[PostgreSQLRepository, Depends(get_client)],
+    import_id: UUID,
+):
+    job = await database.get_import_job(import_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found.")
+    if job.status != ImportStatus.FAILED:
+        raise HTTPException(status_code=409, detail=f"Only failed import jobs can be retried, job is {job.status.value}.")
+    if not Path(job.path).is_file():
+        raise HTTPException(status_code=410, detail="The uploaded file of the import job is no longer available.")
+
+    await database.retry_import_job(import_id)
+    notify_worker()
+    return _job_status(await database.get_import_job(import_id))
+
+
+@router.get(
+    "/import/{import_id}/rejected",
+    description="Download the CSV report of the rows an import rejected, available once the import finished.",
+)
+async def get_rejected_rows(user: Annotated[dict, Depends(get_current_user_payload)], import_id: UUID):
+    path = rejected_report_path(import_id)
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="No report found. The import may still be running.")
+    return FileResponse(path, media_type="text/csv", filename=f"rejected-{import_id}.csv")
+
+
+@router.delete("/delete", description="Delete all data from the database.")
 async def delete_database(
     user: Annotated[dict, Depends(get_current_user_payload)],
     database: Annotated[PostgreSQLRepository, Depends(get_client)],
 ):
-    await database.clear_all()
+    if not await database.clear_all():
+        raise HTTPException(status_code=409, detail="An import is running, try again once it finished.")
     return {"message": "All tables deleted successfully!"}
+
+
+@router.delete(
+    "/delete/{upload_type}",
+    description="Delete all data of an upload type. Deleting the metadata deletes the data of all upload types, as it "
+    "references the cohorts.",
+)
+async def reset_upload_type(
+    user: Annotated[dict, Depends(get_current_user_payload)],
+    database: Annotated[PostgreSQLRepository, Depends(get_client)],
+    upload_type: UploadType,
+):
+    if not await database.reset(upload_type.value):
+        raise HTTPException(
+            status_code=409, detail=f"An import of {upload_type.value} is running, try again once it finished."
+        )
+    return {"message": f"All data of {upload_type.value} deleted successfully!"}
+
+
+def _job_status(job: ImportJob) -> ImportJobStatus:
+    return ImportJobStatus(
+        id=job.id,
+        uploadType=UploadType(job.upload_type),
+        filename=job.filename,
+        rebuild=job.rebuild,
+        status=job.status.value,
+        progress=f"[{job.files_done}/{job.files_total}]" if job.files_total is not None else None,
+        currentFile=job.current_file,
+        filesDone=job.files_done,
+        filesSkipped=job.files_skipped,
+        filesTotal=job.files_total,
+        rowsProcessed=job.rows_processed,
+        rowsRejected=job.rows_rejected,
+        rowsPerSecond=job.rows_per_second,
+        attempts=job.attempts,
+        error=job.error,
+        createdAt=job.created_at,
+        startedAt=job.started_at,
+        finishedAt=job.finished_at,
+    )
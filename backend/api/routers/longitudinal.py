@@ -1,12 +1,18 @@
-from typing import Annotated
+from typing import Annotated, Optional
 
 from database.postgresql import PostgreSQLRepository
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
 
-from api.dependencies import get_client
-from api.model import LongitudinalData
+from api.config import CACHE_CONTROL, MAX_PAGE_SIZE
+from api.dependencies import conditional_get, get_client, get_data_format
+from api.model import DataFormat, LongitudinalData
+from api.responses import ndjson_response, rows_response, set_next_cursor, table_response
 
-router = APIRouter(prefix="/longitudinal", tags=["longitudinal"])
+router = APIRouter(
+    prefix="/longitudinal",
+    tags=["longitudinal"],
+    dependencies=[Depends(conditional_get(CACHE_CONTROL["longitudinal"]))],
+)
 
 
 @router.get("/", description="Get all available longitudinal tables.")
@@ -14,15 +20,46 @@ async def get_longitudinal_tables(database: Annotated[PostgreSQLRepository, Depe
     return await database.get_longitudinal_measurement_variables()
 
 
-@router.get("/{longitudinal}", response_model=list[LongitudinalData], description="Retrieve a longitudinal table.")
-async def get_longitudinal_table(longitudinal: str, database: Annotated[PostgreSQLRepository, Depends(get_client)]):
-    return await database.get_longitudinal_measurements(longitudinal)
+@router.get(
+    "/{longitudinal}",
+    response_model=list[LongitudinalData],
+    description="Retrieve a longitudinal table. Use `limit` and the `X-Next-Cursor` header as `cursor` to page "
+    "through it, `stream` to receive newline-delimited JSON, or `format` (or the Accept header) to receive an "
+    "Arrow IPC stream or a Parquet file.",
+)
+async def get_longitudinal_table(
+    longitudinal: str,
+    response: Response,
+    database: Annotated[PostgreSQLRepository, Depends(get_client)],
+    data_format: Annotated[DataFormat, Depends(get_data_format)],
+    cursor: Annotated[Optional[int], Query(ge=0)] = None,
+    limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+    stream: bool = False,
+):
+    if data_format != DataFormat.JSON:
+        table = await database.export_longitudinal_measurements(longitudinal, after=cursor, limit=limit)
+        return table_response(table, data_format, response.headers)
+
+    if stream:
+        return ndjson_response(
+            await database.stream_longitudinal_measurements(longitudinal, after=cursor, limit=limit), response.headers
+        )
+
+    measurements = await database.get_longitudinal_measurements(longitudinal, after=cursor, limit=limit)
+    set_next_cursor(response, [m["id"] for m in measurements], limit)
+    return rows_response(measurements, LongitudinalData, response.headers)
 
 
 @router.get("/{longitudinal}/{cohort}", description="Retrieve a longitudinal table.")
 async def get_longitudinal_table_for_cohort(
     longitudinal: str,
     cohort: str,
+    response: Response,
     database: Annotated[PostgreSQLRepository, Depends(get_client)],
+    data_format: Annotated[DataFormat, Depends(get_data_format)],
 ):
+    if data_format != DataFormat.JSON:
+        table = await database.export_longitudinal_measurements(longitudinal, cohort)
+        return table_response(table, data_format, response.headers)
+
     return await database.get_longitudinal_measurements(longitudinal, cohort)
@@ -3,9 +3,14 @@ from typing import Annotated
 from database.postgresql import PostgreSQLRepository
 from fastapi import APIRouter, Depends
 
-from api.dependencies import get_client
+from api.config import CACHE_CONTROL
+from api.dependencies import conditional_get, get_client
 
-router = APIRouter(prefix="/visualization", tags=["visualization"])
+router = APIRouter(
+    prefix="/visualization",
+    tags=["visualization"],
+    dependencies=[Depends(conditional_get(CACHE_CONTROL["visualization"]))],
+)
 
 
 @router.get(
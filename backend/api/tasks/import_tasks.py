@@ -1,10 +1,32 @@
-import io
+import asyncio
+import hashlib
 import logging
+import os
+import tempfile
+import time
 import zipfile
+from contextlib import asynccontextmanager
+from functools import partial
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Callable
+from uuid import UUID
 
+import pandas as pd
+from database.models import ImportJob, ImportStatus
 from database.postgresql import PostgreSQLRepository
+from database.typeddicts import ImportStats
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from api.dependencies import AsyncSessionLocal
+from api.config import (
+    IMPORT_CONCURRENCY,
+    IMPORT_REPORT_DIR,
+    IMPORT_SPOOL_DIR,
+    MAX_UPLOAD_SIZE,
+    UPLOAD_CHUNK_SIZE,
+)
+from api.dependencies import AsyncSessionLocal, engine
 from api.model import UploadType
 
 logger = logging.getLogger("background_tasks")
@@ -17,57 +39,334 @@ if not logger.handlers:
     logger.addHandler(handler)
 
 
-async def process_import_background(file_contents: bytes, filename: str, upload_type: UploadType):
+async def spool_upload(file: UploadFile) -> Path:
+    """Copy an upload in chunks into a file in `IMPORT_SPOOL_DIR` the import job reads from.
+
+    Only one chunk is held in memory at a time. The file is removed once the import job succeeded.
+
+    :param file: Uploaded file.
+    :raises HTTPException: 413 if the upload is larger than `MAX_UPLOAD_SIZE`.
+    :return: Path of the spooled file.
     """
-    Background task to process file imports with detailed logging.
+    suffix = Path(file.filename or "").suffix
+    Path(IMPORT_SPOOL_DIR).mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=IMPORT_SPOOL_DIR, prefix="upload-", suffix=suffix, delete=False) as spool:
+        try:
+            size = 0
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_SIZE:
+                    raise HTTPException(
+                        status_code=413, detail=f"Upload exceeds the limit of {MAX_UPLOAD_SIZE} bytes."
+                    )
+                spool.write(chunk)
+        except BaseException:
+            spool.close()
+            os.unlink(spool.name)
+            raise
+    return Path(spool.name)
+
+
+def rejected_report_path(import_id: UUID) -> Path:
+    """Path of the CSV report of the rows an import rejected."""
+    return Path(IMPORT_REPORT_DIR) / f"{import_id}.csv"
+
+
+async def run_import_job(job: ImportJob, jobs: PostgreSQLRepository):
     """
-    logger.info(f"START: Background import for '{filename}' (Type: {upload_type.value})")
+    Run a claimed import job, recording its progress and outcome on the job.
+
+    The spooled upload is streamed file by file. Measurement files are imported concurrently, up to
+    `IMPORT_CONCURRENCY` at a time, each with its own session. Files whose content hash matches the one recorded by
+    the last import of their variable or modality are skipped, changed files replace the previously imported rows.
+    Rebuilds load all files into shadow tables instead, which replace the live tables of the upload type once all
+    files were imported. Imports of the same upload type by other workers wait for the job to finish.
+    The upload is removed once the import succeeded, failed jobs keep it so they can be retried.
 
+    :param job: Claimed import job.
+    :param jobs: Repository the job is tracked with, separate from the sessions the data is imported with. Requires an
+        engine.
+    """
+    run = _ImportJobRun(job, jobs)
+    logger.info(
+        f"START: Import job {job.id} for '{job.filename}' (Type: {run.upload_type.value}, attempt {job.attempts})"
+    )
     try:
-        async with AsyncSessionLocal() as session:
-            async with PostgreSQLRepository(session) as repo:
-                logger.debug("Database connection established for background task.")
+        await run.run()
+        await jobs.update_import_job(
+            job.id, status=ImportStatus.SUCCEEDED, current_file=None, finished_at=func.now()
+        )
+        run.path.unlink(missing_ok=True)
+        logger.info(f"SUCCESS: Finished import job {job.id} for '{job.filename}'")
 
-                if filename.endswith(".zip") and file_contents.startswith(b"PK"):
-                    logger.info(f"Processing ZIP archive: {filename}")
+    except (Exception, asyncio.CancelledError) as e:
+        if asyncio.current_task().cancelling():
+            # Shutdown while importing, let the next worker start over. The database driver may have turned the
+            # cancellation into an error while cleaning up, so it is raised again either way.
+            await jobs.update_import_job(job.id, status=ImportStatus.QUEUED)
+            raise asyncio.CancelledError from e
 
-                    with zipfile.ZipFile(io.BytesIO(file_contents)) as z:
-                        csv_files = [f for f in z.namelist() if f.endswith(".csv")]
-                        logger.info(f"Found {len(csv_files)} CSV files in archive.")
+        logger.error(f"FAILURE: Error during import job {job.id} for '{job.filename}'", exc_info=True)
+        await jobs.update_import_job(
+            job.id, status=ImportStatus.FAILED, error=f"{type(e).__name__}: {e}", finished_at=func.now()
+        )
 
-                        for i, member_name in enumerate(csv_files, 1):
-                            logger.info(f"[{i}/{len(csv_files)}] Importing file: {member_name}")
+    finally:
+        _write_rejected_report(job.id, run.rejected)
 
-                            with z.open(member_name) as csv_file:
-                                csv_data = csv_file.read()
-                                variable_name = member_name[:-4]
-                                await _run_import(repo, upload_type, csv_data, variable_name)
 
-                elif filename.endswith(".csv"):
-                    logger.info(f"Processing single CSV file: {filename}")
-                    variable_name = filename[:-4]
-                    await _run_import(repo, upload_type, file_contents, variable_name)
+class _ImportJobRun:
+    def __init__(self, job: ImportJob, jobs: PostgreSQLRepository):
+        """Initialize the state of an import job shared by the files it imports.
 
-                logger.info(f"SUCCESS: Finished background import for '{filename}'")
+        :param job: Claimed import job.
+        :param jobs: Repository the job is tracked with.
+        """
+        self.job = job
+        self.jobs = jobs
+        self.path = Path(job.path)
+        self.upload_type = UploadType(job.upload_type)
+        self.rejected: list[pd.DataFrame] = []
+        self.rows = self.rows_rejected = self.files_done = self.files_skipped = 0
+        self.started = time.monotonic()
+        # Metadata and CDM files depend on each other's cohorts and concepts, so only measurements run concurrently
+        measurements = self.upload_type in (UploadType.LONGITUDINAL, UploadType.BIOMARKERS)
+        self.concurrency = IMPORT_CONCURRENCY if measurements else 1
+        self.slots = asyncio.Semaphore(self.concurrency)
+        # The job session is shared by all files and must not be used concurrently
+        self.progress_lock = asyncio.Lock()
+        self.manifest: dict[str, str] = {}
+        self.shadow_schema: str | None = None
+        # Content hashes of the files imported by a rebuild, recorded once its tables were swapped in
+        self.imported: dict[str, str] = {}
+        # Cohort ids by name shared by the repositories of all files, not loaded for metadata as it changes the cohorts
+        self.cohort_map: dict[str, int] | None = None
 
-    except Exception:
-        logger.error(f"FAILURE: Error during import of '{filename}'", exc_info=True)
+    async def run(self):
+        """Import all files of the upload while holding the import lock of its upload type."""
+        upload_type = self.upload_type.value
+        async with self.jobs.import_lock(upload_type):
+            if self.upload_type != UploadType.METADATA:
+                self.cohort_map = await self.jobs.load_cohort_map()
+            if not self.job.rebuild:
+                self.manifest = await self.jobs.get_import_manifest(upload_type)
+                await self.import_files()
+                return
 
+            # Every file is loaded into the empty shadow tables, the manifest stays empty so none is skipped
+            self.shadow_schema = await self.jobs.create_shadow_tables(upload_type)
+            logger.info(f"Rebuilding the {upload_type} tables in schema '{self.shadow_schema}'")
+            try:
+                await self.import_files()
+            except Exception:
+                await self.jobs.drop_shadow_tables(upload_type)
+                raise
+            await self.jobs.swap_shadow_tables(upload_type, self.imported)
+            logger.info(f"Swapped in the rebuilt {upload_type} tables")
 
-async def _run_import(repo: PostgreSQLRepository, upload_type: UploadType, data: bytes, variable_name: str):
-    """Helper to route the import."""
+    async def import_files(self):
+        """Import the CSV files of a ZIP archive, or the single uploaded CSV file."""
+        filename = self.job.filename
+        if filename.endswith(".zip") and zipfile.is_zipfile(self.path):
+            logger.info(f"Processing ZIP archive: {filename}")
+            with zipfile.ZipFile(self.path) as z:
+                csv_files = [f for f in z.namelist() if f.endswith(".csv")]
+                logger.info(f"Found {len(csv_files)} CSV files in archive, importing {self.concurrency} at a time.")
+                await self.jobs.update_import_job(self.job.id, files_total=len(csv_files))
+                await self._import_concurrently(
+                    [
+                        self.import_file(partial(z.open, member_name), member_name, i, len(csv_files))
+                        for i, member_name in enumerate(csv_files, 1)
+                    ]
+                )
+
+        elif filename.endswith(".csv"):
+            logger.info(f"Processing single CSV file: {filename}")
+            await self.jobs.update_import_job(self.job.id, files_total=1)
+            await self.import_file(partial(open, self.path, "rb"), filename, 1, 1)
+
+    @staticmethod
+    async def _import_concurrently(imports: list):
+        """Run file imports as concurrent tasks, cancelling the remaining ones once an import failed."""
+        tasks = [asyncio.create_task(file_import) for file_import in imports]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # The first failure cancels the imports of the remaining files
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def import_file(self, open_file: Callable[[], BinaryIO], name: str, i: int, total: int):
+        """Import a file unless its content is unchanged since its last import, and record the job's progress."""
+        variable_name = name[:-4]
+        stats = None
+        async with self.slots:
+            content_hash = await asyncio.to_thread(_content_hash, open_file)
+            if self.manifest.get(variable_name) == content_hash:
+                logger.info(f"[{i}/{total}] Skipping unchanged file: {name}")
+                self.files_skipped += 1
+            else:
+                logger.info(f"[{i}/{total}] Importing file: {name}")
+                async with self.progress_lock:
+                    await self.jobs.update_import_job(self.job.id, current_file=name)
+                stats = await self._import_changed_file(open_file, variable_name, content_hash)
+        await self._record_progress(stats)
+
+    async def _import_changed_file(
+        self, open_file: Callable[[], BinaryIO], variable_name: str, content_hash: str
+    ) -> ImportStats | None:
+        """Import a file with a session of its own and record its content hash."""
+        async with _import_session(self.shadow_schema) as session:
+            async with PostgreSQLRepository(session, cohort_map=self.cohort_map) as repo:
+                with open_file() as csv_file:
+                    stats = await _run_import(
+                        repo,
+                        self.upload_type,
+                        csv_file,
+                        variable_name,
+                        self.job.use_copy,
+                        self.rejected,
+                        replace=not self.job.rebuild,
+                    )
+                if self.job.rebuild:
+                    self.imported[variable_name] = content_hash
+                else:
+                    await repo.record_import(self.upload_type.value, variable_name, content_hash)
+        return stats
+
+    async def _record_progress(self, stats: ImportStats | None):
+        """Count a finished file and its rows on the job."""
+        async with self.progress_lock:
+            self.files_done += 1
+            if stats is not None:
+                self.rows += stats["inserted"] + stats["skipped"] + len(stats["rejected"])
+                self.rows_rejected += len(stats["rejected"])
+            await self.jobs.update_import_job(
+                self.job.id,
+                files_done=self.files_done,
+                files_skipped=self.files_skipped,
+                rows_processed=self.rows,
+                rows_rejected=self.rows_rejected,
+                rows_per_second=self.rows / (time.monotonic() - self.started),
+            )
+
+
+async def load_measurements(
+    upload_type: UploadType, measurements: dict[str, pd.DataFrame], rebuild: bool = False, use_copy: bool = True
+) -> ImportStats:
+    """
+    Load measurements held in memory, e.g. the output of the preprocessing, without writing and uploading CSV files.
+
+    Waits for imports of the same upload type like an import job. A rebuild loads the measurements into shadow tables
+    that replace all measurements of the upload type once loaded, otherwise the measurements of the loaded variables
+    are replaced.
+
+    :param upload_type: Upload type of the measurements, longitudinal or biomarkers.
+    :param measurements: Data frames with the columns of the measurement CSV files, by variable name.
+    :param rebuild: Replace all measurements of the upload type, defaults to False.
+    :param use_copy: Bulk load through COPY and a staging table instead of INSERT statements, defaults to True.
+    :return: Number of inserted measurements and of measurements skipped as duplicates, and the rejected rows.
+    """
+    if upload_type == UploadType.LONGITUDINAL:
+        load = PostgreSQLRepository.load_longitudinal_measurements
+    elif upload_type == UploadType.BIOMARKERS:
+        load = PostgreSQLRepository.load_biomarker_measurements
+    else:
+        raise ValueError(f"Only measurements can be loaded, not {upload_type.value}")
+
+    logger.info(f"START: Loading {len(measurements)} {upload_type.value} variables (rebuild: {rebuild})")
+    async with PostgreSQLRepository(AsyncSessionLocal(), engine) as jobs:
+        async with jobs.import_lock(upload_type.value):
+            shadow_schema = await jobs.create_shadow_tables(upload_type.value) if rebuild else None
+            try:
+                async with _import_session(shadow_schema) as session:
+                    async with PostgreSQLRepository(session) as repo:
+                        stats = await load(repo, measurements, use_copy, replace=not rebuild)
+            except Exception:
+                if rebuild:
+                    await jobs.drop_shadow_tables(upload_type.value)
+                raise
+            if rebuild:
+                # No file was imported, so the manifest is left empty
+                await jobs.swap_shadow_tables(upload_type.value, {})
+
+    logger.info(
+        f"SUCCESS: Loaded {upload_type.value} variables: {stats['inserted']} rows inserted, "
+        f"{stats['skipped']} duplicates skipped, {len(stats['rejected'])} rows rejected"
+    )
+    return stats
+
+
+@asynccontextmanager
+async def _import_session(shadow_schema: str | None) -> AsyncIterator[AsyncSession]:
+    """Open the session a file is imported with, writing into the tables of a shadow schema if given."""
+    if shadow_schema is None:
+        async with AsyncSessionLocal() as session:
+            yield session
+        return
+
+    async with engine.connect() as conn:
+        # Tables missing in the shadow schema, like the cohorts, resolve to the live ones
+        await conn.execute(
+            select(func.set_config("search_path", f"{shadow_schema}, " + func.current_setting("search_path"), False))
+        )
+        await conn.commit()
+        try:
+            async with AsyncSessionLocal(bind=conn) as session:
+                yield session
+        finally:
+            # Discarded instead of returned to the pool with the changed search path
+            await conn.invalidate()
+
+
+def _content_hash(open_file: Callable[[], BinaryIO]) -> str:
+    """SHA-256 hex digest of a file, read in chunks without parsing it."""
+    with open_file() as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _write_rejected_report(import_id: UUID, rejected: list[pd.DataFrame]):
+    """Write the rows rejected by the files of an import into a single CSV report."""
+    path = rejected_report_path(import_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    report = pd.concat(rejected, ignore_index=True) if rejected else pd.DataFrame(columns=["file", "line", "reason"])
+    report.to_csv(path, index=False)
+    logger.info(f"Import {import_id} rejected {len(report)} rows, report written to '{path}'")
+
+
+async def _run_import(
+    repo: PostgreSQLRepository,
+    upload_type: UploadType,
+    data: BinaryIO,
+    variable_name: str,
+    use_copy: bool = True,
+    rejected: list[pd.DataFrame] | None = None,
+    replace: bool = False,
+) -> ImportStats | None:
+    """Helper to route the import, collecting the rejected rows of measurement files."""
     try:
+        stats = None
         if upload_type == UploadType.LONGITUDINAL:
-            await repo.import_longitudinal_measurements(data, variable_name)
+            stats = await repo.import_longitudinal_measurements(data, variable_name, use_copy, replace)
 
         elif upload_type == UploadType.BIOMARKERS:
-            await repo.import_biomarker_measurements(data, variable_name)
+            stats = await repo.import_biomarker_measurements(data, variable_name, use_copy, replace)
 
         elif upload_type == UploadType.METADATA:
-            await repo.import_metadata(data)
+            await repo.import_metadata(data, replace)
 
         elif upload_type == UploadType.CDM:
-            await repo.import_cdm(data, modality=variable_name)
+            await repo.import_cdm(data, modality=variable_name, replace=replace)
+
+        if stats is not None:
+            logger.info(
+                f"'{variable_name}': {stats['inserted']} rows inserted, {stats['skipped']} duplicates skipped, "
+                f"{len(stats['rejected'])} rows rejected"
+            )
+            if rejected is not None and not stats["rejected"].empty:
+                rejected.append(pd.concat({variable_name: stats["rejected"]}, names=["file"]).reset_index(0))
+        return stats
 
     except Exception as e:
         logger.error(f"Error processing sub-file '{variable_name}': {str(e)}")
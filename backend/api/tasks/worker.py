@@ -0,0 +1,67 @@
+import asyncio
+from contextlib import suppress
+
+from database.postgresql import PostgreSQLRepository
+
+from api.config import IMPORT_JOB_STALE_AFTER, IMPORT_WORKER_POLL_INTERVAL
+from api.dependencies import AsyncSessionLocal, engine
+from api.tasks.import_tasks import logger, run_import_job
+
+_wakeup = asyncio.Event()
+
+
+def notify_worker():
+    """Wake up the worker of this process after a job was queued instead of waiting for its next poll."""
+    _wakeup.set()
+
+
+async def process_next_job() -> bool:
+    """Claim and run the oldest queued import job.
+
+    :return: Whether a job was processed.
+    """
+    async with AsyncSessionLocal() as session:
+        async with PostgreSQLRepository(session, engine) as jobs:
+            job = await jobs.claim_import_job(IMPORT_JOB_STALE_AFTER)
+            if job is None:
+                return False
+            await run_import_job(job, jobs)
+    return True
+
+
+async def run_worker(poll_interval: float = IMPORT_WORKER_POLL_INTERVAL):
+    """Process queued import jobs one at a time until cancelled.
+
+    :param poll_interval: Seconds to wait for new jobs when the queue is empty.
+    """
+    logger.info("Import worker started.")
+    # Checked instead of looping forever, as a cancellation may surface as a driver error that is handled below
+    while not asyncio.current_task().cancelling():
+        _wakeup.clear()
+        try:
+            if await process_next_job():
+                continue
+        except Exception:
+            logger.error("Import worker failed to process a job.", exc_info=True)
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), poll_interval)
+        except TimeoutError:
+            pass
+
+
+async def main():
+    """Run a standalone worker, creating the tables first like the API does."""
+    from database.models import create_schema
+
+    async with engine.begin() as conn:
+        await conn.run_sync(create_schema)
+    try:
+        await run_worker()
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    with suppress(KeyboardInterrupt):
+        asyncio.run(main())
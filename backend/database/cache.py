@@ -0,0 +1,116 @@
+import functools
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import DataVersion
+
+load_dotenv()
+
+_MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, maxsize: int):
+        """Initialize a bounded cache that evicts the least recently used entries.
+
+        :param maxsize: Maximum number of entries kept in the cache.
+        """
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Retrieve an entry and mark it as recently used.
+
+        :param key: Key of the entry.
+        :param default: Value returned if the key is not cached, defaults to None.
+        :return: The cached value or the default.
+        """
+        value = self._entries.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store an entry, evicting the least recently used one if the cache is full.
+
+        :param key: Key of the entry.
+        :param value: Value to cache.
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries."""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DataGeneration:
+    def __init__(self, ttl: float):
+        """Initialize the process-local view of the data generation counter.
+
+        The counter is stored in the `data_version` table and incremented after every import or reset. Other
+        processes notice an increment within `ttl` seconds, the process that incremented it immediately.
+
+        :param ttl: Number of seconds a read counter is trusted before it is read again.
+        """
+        self.ttl = ttl
+        self._value: Optional[int] = None
+        self._checked_at = 0.0
+
+    async def current(self, session: AsyncSession) -> int:
+        """Retrieve the current data generation, reading it from the database only if the local copy expired.
+
+        :param session: Session used to read the counter.
+        :return: The current data generation.
+        """
+        if self._value is None or time.monotonic() - self._checked_at > self.ttl:
+            result = await session.execute(select(DataVersion.generation).filter_by(id=DataVersion.SINGLETON_ID))
+            self.update(result.scalar_one_or_none() or 0)
+        return self._value  # type: ignore[return-value]
+
+    def update(self, value: int):
+        """Set the local copy of the data generation.
+
+        :param value: The data generation read from or written to the database.
+        """
+        if value != self._value:
+            reference_cache.clear()
+        self._value = value
+        self._checked_at = time.monotonic()
+
+
+reference_cache = LRUCache(maxsize=int(os.getenv("REFERENCE_CACHE_SIZE", "256")))
+data_generation = DataGeneration(ttl=float(os.getenv("DATA_GENERATION_TTL", "5")))
+
+
+def cached(method):
+    """Cache the result of a repository read method until the data generation changes.
+
+    Entries are keyed by the method, its arguments and the data generation. A hit within the generation's time
+    to live does not touch the database, so no connection is checked out of the pool. Cached values are shared by
+    all requests, so methods return immutable plain data such as tuples of rows, never session-bound entities.
+    """
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        generation = await data_generation.current(self.session)
+        key = (method.__qualname__, args, tuple(sorted(kwargs.items())), generation)
+        value = reference_cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = await method(self, *args, **kwargs)
+            reference_cache.set(key, value)
+        return value
+
+    return wrapper
@@ -1,15 +1,27 @@
 import enum
+import uuid
+from datetime import datetime
 from typing import Optional
 
 from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    DateTime,
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
+    Text,
     UniqueConstraint,
+    Uuid,
+    func,
 )
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.schema import CreateIndex
 
 
 class Base(DeclarativeBase):
@@ -21,6 +33,13 @@ class ConceptSource(enum.Enum):
     CDM = "cdm"
 
 
+class ImportStatus(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
 class Cohort(Base):
     __tablename__ = "cohorts"
 
@@ -85,7 +104,17 @@ class Mapping(Base):
 
 class LongitudinalMeasurement(Base):
     __tablename__ = "longitudinal_measurements"
-    __table_args__ = (UniqueConstraint("variable", "months", "cohort_id", name="uq_variable_months_cohort"),)
+    __table_args__ = (
+        UniqueConstraint("variable", "months", "cohort_id", name="uq_variable_months_cohort"),
+        # Covers the per-variable and per-cohort reads so they can be answered by index-only scans
+        Index(
+            "ix_longitudinal_variable_cohort_months",
+            "variable",
+            "cohort_id",
+            "months",
+            postgresql_include=["patient_count", "total_patient_count"],
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     variable: Mapped[str] = mapped_column(String, nullable=False)
@@ -101,6 +130,15 @@ class BiomarkerMeasurement(Base):
     __tablename__ = "biomarker_measurements"
     __table_args__ = (
         UniqueConstraint("participant_id", "cohort_id", "variable", name="uq_participant_cohort_variable"),
+        # Matches the variable + cohort + diagnosis filters and DISTINCT variable/diagnosis lookups,
+        # including the measurement so distributions can be read without touching the heap
+        Index(
+            "ix_biomarker_variable_cohort_diagnosis",
+            "variable",
+            "cohort_id",
+            "diagnosis",
+            postgresql_include=["measurement"],
+        ),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -111,3 +149,73 @@ class BiomarkerMeasurement(Base):
     diagnosis: Mapped[str] = mapped_column(String, nullable=False)
 
     cohort: Mapped["Cohort"] = relationship(back_populates="biomarker_measurements")
+
+
+class ChordDiagram(Base):
+    __tablename__ = "chord_diagrams"
+
+    modality: Mapped[str] = mapped_column(String, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    nodes: Mapped[list[dict[str, str]]] = mapped_column(JSONB, nullable=False)
+    links: Mapped[list[dict[str, str]]] = mapped_column(JSONB, nullable=False)
+
+
+class DataVersion(Base):
+    __tablename__ = "data_version"
+
+    SINGLETON_ID = 1
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    generation: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+    # Workers claim the oldest queued job
+    __table_args__ = (Index("ix_import_jobs_status_created", "status", "created_at"),)
+
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True)
+    upload_type: Mapped[str] = mapped_column(String, nullable=False)
+    filename: Mapped[str] = mapped_column(String, nullable=False)
+    path: Mapped[str] = mapped_column(String, nullable=False)  # Spooled upload, removed once imported
+    use_copy: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+    rebuild: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)  # Load into shadow tables and swap
+    status: Mapped[ImportStatus] = mapped_column(Enum(ImportStatus), nullable=False, default=ImportStatus.QUEUED)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    files_total: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    files_done: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    files_skipped: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # Unchanged since last import
+    current_file: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    rows_processed: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    rows_rejected: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    rows_per_second: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class ImportManifest(Base):
+    """Content hash of the file a variable or modality was last imported from."""
+
+    __tablename__ = "import_manifest"
+
+    upload_type: Mapped[str] = mapped_column(String, primary_key=True)
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    imported_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+def create_schema(connection: Connection):
+    """Create the missing tables and the indexes added to tables that already exist.
+
+    `create_all` skips existing tables together with their indexes, so databases created before an index was added
+    would never get it.
+
+    :param connection: Connection the schema is created with, e.g. via `AsyncConnection.run_sync`.
+    """
+    Base.metadata.create_all(connection)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True))
@@ -1,39 +1,340 @@
+import asyncio
+import csv
 import io
+import uuid
 from collections import defaultdict
-from typing import Optional, cast
-
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from itertools import combinations, groupby
+from operator import itemgetter
+from types import MappingProxyType
+from typing import AsyncIterator, BinaryIO, Callable, Optional, cast
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from dotenv import load_dotenv
-from sqlalchemy import select
+from sqlalchemy import (
+    Integer,
+    MetaData,
+    Row,
+    Select,
+    String,
+    Table,
+    bindparam,
+    column,
+    delete,
+    func,
+    literal,
+    or_,
+    select,
+    table,
+    text,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import aliased
+from sqlalchemy.types import TypeEngine
 
+from database.cache import cached, data_generation
 from database.models import (
     Base,
     BiomarkerMeasurement,
+    ChordDiagram,
     Cohort,
     Concept,
     ConceptSource,
+    DataVersion,
+    ImportJob,
+    ImportManifest,
+    ImportStatus,
     LongitudinalMeasurement,
     Mapping,
+    create_schema,
 )
-from database.typeddicts import CohortStats
+from database.typeddicts import CohortStats, ImportStats
 
 load_dotenv()
 
+# Resolution of the binned counts the kernel density estimate is computed from
+_KDE_BINS = 512
+
+# Number of rows fetched per round trip from server-side cursors
+STREAM_BATCH_SIZE = 1000
+
+# Number of rows per INSERT statement when imports do not use COPY
+INSERT_BATCH_SIZE = 5000
+
+# Number of CSV rows parsed and loaded at once by measurement imports, bounding their memory use
+IMPORT_CHUNK_ROWS = 100_000
+
+# Columns the measurement CSV files and the data frames loaded directly must contain
+LONGITUDINAL_COLUMNS = {"months", "cohort", "patientCount", "totalPatientCount"}
+BIOMARKER_COLUMNS = {"participantNumber", "cohort", "measurement", "diagnosis"}
+
+# Tables holding the data of every upload type, referenced tables first
+UPLOAD_TABLES: dict[str, list[Table]] = {
+    "metadata": [Cohort.__table__],
+    "cdm": [Concept.__table__, Mapping.__table__, ChordDiagram.__table__],
+    "longitudinal": [LongitudinalMeasurement.__table__],
+    "biomarkers": [BiomarkerMeasurement.__table__],
+}
+
+# First key of the advisory locks serializing the imports of an upload type, the second key is the upload type
+IMPORT_LOCK_CLASS = 0x5044
+
+
+class EmptyRangeError(ValueError):
+    """Raised when a requested histogram range contains no values, as its lower edge is not below its upper edge."""
+
+
+def _paginate(query: Select, id_column, after: Optional[int], limit: Optional[int]) -> Select:
+    """Apply keyset pagination on an id column to a query.
+
+    :param query: Query to paginate.
+    :param id_column: Unique, indexed column the pages are ordered by.
+    :param after: Only rows with a larger id are selected, defaults to all rows.
+    :param limit: Maximum number of rows, defaults to no limit.
+    :return: The paginated query, ordered by the id column if paginated.
+    """
+    if after is None and limit is None:
+        return query
+    query = query.order_by(id_column)
+    if after is not None:
+        query = query.where(id_column > after)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def _csv_source(csv_data: bytes | BinaryIO) -> BinaryIO:
+    """Wrap CSV file content in bytes into a file object, file objects are passed through to be streamed."""
+    return io.BytesIO(csv_data) if isinstance(csv_data, bytes) else csv_data
+
+
+def _map_cohort_ids(names: pd.Series, cohort_map: dict[str, int]) -> pd.Series:
+    """Map a column of cohort names to cohort ids, with NaN for unknown cohorts.
+
+    The names are stripped and looked up once per distinct value rather than once per row.
+    """
+    codes, uniques = pd.factorize(names)
+    ids = np.array([cohort_map.get(str(name).strip(), np.nan) for name in uniques] + [np.nan])
+    return pd.Series(ids[codes], index=names.index)
+
+
+def _to_number(values: pd.Series) -> pd.Series:
+    """Convert a column to floats, with NaN for missing values and values that are not numbers."""
+    return pd.to_numeric(values, errors="coerce").astype("float64")
+
+
+def _not_integer(values: pd.Series) -> pd.Series:
+    """Mask missing and fractional values of a numeric column."""
+    return values.isna() | (values % 1 != 0)
+
+
+def _split_rejected(df: pd.DataFrame, checks: dict[str, pd.Series]) -> tuple[pd.Series, pd.DataFrame]:
+    """Split the rows read from an import file into valid and rejected rows.
+
+    :param df: Rows as read from the CSV file, with the default index.
+    :param checks: Masks of the invalid rows by the reason they are rejected for. Rows failing several checks
+        are reported with the first one.
+    :return: Mask of the valid rows, and the rejected rows with their line in the CSV file and the reason.
+    """
+    reasons = pd.Series(np.select(list(checks.values()), list(checks), default=""), index=df.index)
+    valid = reasons == ""
+    rejected = df[~valid].assign(line=df.index[~valid] + 2, reason=reasons[~valid])
+    return valid, rejected[["line", "reason", *df.columns]]
+
+
+def _prepare_longitudinal_records(
+    df: pd.DataFrame, variable_name: str, cohort_map: dict[str, int]
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Convert rows of a longitudinal measurements CSV file into table records.
+
+    :param df: Rows as read from the CSV file.
+    :param variable_name: Name of the imported variable.
+    :param cohort_map: Dictionary mapping cohort names to ids.
+    :return: The records of the valid rows, and the rejected rows.
+    """
+    cohort_ids = _map_cohort_ids(df["cohort"], cohort_map)
+    months = _to_number(df["months"])
+    patient_counts = _to_number(df["patientCount"])
+    total_patient_counts = _to_number(df["totalPatientCount"])
+    valid, rejected = _split_rejected(
+        df,
+        {
+            "unknown cohort": cohort_ids.isna(),
+            "months is not a number": months.isna(),
+            "patientCount is not an integer": _not_integer(patient_counts),
+            "totalPatientCount is not an integer": _not_integer(total_patient_counts),
+        },
+    )
+    records = pd.DataFrame(
+        {
+            "variable": variable_name,
+            "months": months[valid],
+            "cohort_id": cohort_ids[valid].astype("int64"),
+            "patient_count": patient_counts[valid].astype("int64"),
+            "total_patient_count": total_patient_counts[valid].astype("int64"),
+        }
+    )
+    return records, rejected
+
+
+def _prepare_biomarker_records(
+    df: pd.DataFrame, variable_name: str, cohort_map: dict[str, int]
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Convert rows of a biomarker measurements CSV file into table records.
+
+    :param df: Rows as read from the CSV file.
+    :param variable_name: Name of the imported variable.
+    :param cohort_map: Dictionary mapping cohort names to ids.
+    :return: The records of the valid rows, and the rejected rows.
+    """
+    cohort_ids = _map_cohort_ids(df["cohort"], cohort_map)
+    participant_ids = _to_number(df["participantNumber"])
+    measurements = _to_number(df["measurement"])
+    valid, rejected = _split_rejected(
+        df,
+        {
+            "unknown cohort": cohort_ids.isna(),
+            "participantNumber is not an integer": _not_integer(participant_ids),
+            "measurement is not a number": measurements.isna(),
+            "diagnosis is missing": df["diagnosis"].isna(),
+        },
+    )
+    records = pd.DataFrame(
+        {
+            "variable": variable_name,
+            "participant_id": participant_ids[valid].astype("int64"),
+            "cohort_id": cohort_ids[valid].astype("int64"),
+            "measurement": measurements[valid],
+            "diagnosis": df["diagnosis"][valid].astype("string"),
+        }
+    )
+    return records, rejected
+
+
+def _unnest(**columns: tuple[list, TypeEngine]) -> Select:
+    """Select rows from equally long lists of column values.
+
+    Every list is bound as a single array parameter, which keeps large inserts cheap to compile compared to a
+    multi-row VALUES clause with one parameter per value.
+
+    :param columns: Values and SQL type of every column, by column name.
+    :return: Select statement yielding one row per list index.
+    """
+    return select(
+        *(
+            func.unnest(bindparam(name, values, type_=ARRAY(type_))).label(name)
+            for name, (values, type_) in columns.items()
+        )
+    )
+
+
+def _distinct_values(column) -> Select:
+    """Select the sorted distinct non-null values of an indexed column with a recursive loose index scan.
+
+    Every step seeks the next larger value in the index, so the cost grows with the number of distinct values
+    instead of the number of rows as with a plain ``SELECT DISTINCT``.
+
+    :param column: Column whose leading index is used for the scan.
+    :return: Select statement yielding one distinct value per row.
+    """
+    values = select(func.min(column).label("value")).cte("distinct_values", recursive=True)
+    values = values.union_all(
+        select(select(func.min(column)).where(column > values.c.value).scalar_subquery()).where(
+            values.c.value.is_not(None)
+        )
+    )
+    return select(values.c.value).where(values.c.value.is_not(None)).order_by(values.c.value)
+
+
+def _mapped_study_variables(rows) -> list[tuple[str, str]]:
+    """Collect the unique (label, cohort) pairs of the study variables mapped to a CDM concept, in mapping order."""
+    study_vars = []
+    for _, variable, study in rows:
+        label = (variable or "").strip()
+        if label and study:
+            study_vars.append((label, study))
+    return list(dict.fromkeys(study_vars))
+
+
+def _chord_diagram(rows: list) -> dict:
+    """Build the nodes and links of a chord diagram.
+
+    Study variables mapped to the same CDM concept are linked if they belong to different cohorts. CDM concepts that
+    only map to a single cohort are skipped.
+
+    :param rows: (CDM concept id, study variable, cohort name) rows ordered by CDM concept.
+    :return: A dictionary containing the nodes and the links of the chord diagram.
+    """
+    # Dictionaries de-duplicate nodes and undirected links while keeping the order they were found in
+    nodes: dict[tuple[str, str], None] = {}
+    links: dict[tuple[str, str], None] = {}
+    for _, concept_rows in groupby(rows, key=itemgetter(0)):
+        study_vars = _mapped_study_variables(concept_rows)
+        if len({study for _, study in study_vars}) < 2:
+            continue
+        nodes.update(dict.fromkeys(study_vars))
+        for (label_a, study_a), (label_b, study_b) in combinations(study_vars, 2):
+            if study_a != study_b and label_a != label_b:
+                links.setdefault((min(label_a, label_b), max(label_a, label_b)))
+    return {
+        "nodes": [{"name": name, "group": group} for name, group in nodes],
+        "links": [{"source": source, "target": target} for source, target in links],
+    }
+
+
+def _cohort_ranking(cohort_stats: dict[str, CohortStats], total_variables: int) -> pd.DataFrame:
+    """Rank the cohorts by their number of found variables, skipping cohorts without any.
+
+    :param cohort_stats: Found and missing variables by cohort name.
+    :param total_variables: Number of requested variables.
+    :return: pd.DataFrame with the columns cohort, found and missing.
+    """
+    rows = []
+    for cohort_name, stats in cohort_stats.items():
+        found_count: int = stats["found"]  # type: ignore
+        if found_count == 0:
+            continue  # skip cohorts with 0 availability
+
+        missing_vars = ", ".join(stats["missing"])
+        percentage = round((found_count / total_variables) * 100, 2)
+        found_str = f"{found_count}/{total_variables} ({percentage}%)"
+        rows.append({"cohort": cohort_name, "found": found_str, "missing": missing_vars})
+
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        df.sort_values(by="found", ascending=False, inplace=True)
+        df.reset_index(drop=True, inplace=True)
+    return df
+
 
 class PostgreSQLRepository:
-    def __init__(self, session: AsyncSession, engine: Optional[AsyncEngine] = None):
+    def __init__(
+        self,
+        session: AsyncSession,
+        engine: Optional[AsyncEngine] = None,
+        cohort_map: Optional[dict[str, int]] = None,
+    ):
         """Initialize the PostgreSQL database engine and session.
 
         :param connection_string: SQLAlchemy-compatible PostgreSQL connection URI.
         :param pool_size: Maximum number of database connections to maintain in the pool, defaults to 10
         :param max_overflow: Maximum overflow connections beyond pool_size, defaults to 20
         :param pool_timeout: Maximum wait time (in seconds) for a connection from the pool, defaults to 30
+        :param cohort_map: Cohort ids by name for the imports of this repository, e.g. loaded once per import job
+            with `load_cohort_map` and shared by the repositories of its files, defaults to None (loaded on first use).
         """
         self.session = session
         self.engine = engine
+        # Cohort ids by name used by the imports of this repository, reloaded after metadata changes
+        self._import_cohort_map: Optional[dict[str, int]] = cohort_map
 
     async def __aenter__(self):
         """Enter the runtime context for use in an `asycn with` statement.
@@ -53,13 +354,74 @@ class PostgreSQLRepository:
             await self.session.rollback()
         await self.close()
 
-    async def get_cohorts(self) -> list[Cohort]:
+    @cached
+    async def get_cohorts(self) -> tuple[Row, ...]:
         """Retrieve all cohort metadata from the database.
 
-        :return: List of all cohort metadata.
+        Plain rows are returned instead of entities, as cached entities stay bound to the session that loaded them.
+
+        :return: Rows of all cohort metadata with the columns of the cohort table as attributes.
         """
-        result = await self.session.execute(select(Cohort))
-        return list(result.scalars().all())
+        result = await self.session.execute(select(*Cohort.__table__.columns))
+        return tuple(result.all())
+
+    @cached
+    async def get_cohort_ids(self) -> MappingProxyType[str, int]:
+        """Retrieve the ids of all cohorts by name.
+
+        :return: Read-only mapping of cohort names to ids.
+        """
+        result = await self.session.execute(select(Cohort.name, Cohort.id))
+        return MappingProxyType({name: cohort_id for name, cohort_id in result.all()})
+
+    async def _resolve_cohort_id(self, name: str) -> int:
+        """Resolve a cohort name to its id, using the cached name to id map before querying the database.
+
+        :param name: Name of the cohort.
+        :raises ValueError: If no cohort with the given name exists.
+        :return: The id of the cohort.
+        """
+        cohort_id = (await self.get_cohort_ids()).get(name)
+        if cohort_id is None:
+            # The cached map may predate a metadata import in another process
+            cohort_id = (await self.get_cohort(name)).id
+        return cohort_id
+
+    async def load_cohort_map(self) -> dict[str, int]:
+        """Retrieve the ids of all cohorts by name for imports, bypassing the reference cache.
+
+        The map is loaded once per repository and reused by all following imports until the cohort metadata
+        changes. Import jobs pass it on to the repositories of their files, so an archive with many files resolves
+        the cohorts a single time.
+
+        :return: Dictionary mapping cohort names to ids.
+        """
+        if self._import_cohort_map is None:
+            result = await self.session.execute(select(Cohort.name, Cohort.id))
+            self._import_cohort_map = {name: cohort_id for name, cohort_id in result.all()}
+        return self._import_cohort_map
+
+    async def get_data_generation(self) -> int:
+        """Retrieve the data generation, which changes whenever imported data changes.
+
+        :return: The current data generation.
+        """
+        return await data_generation.current(self.session)
+
+    async def bump_data_generation(self) -> int:
+        """Increment the data generation after data was changed, invalidating cached reads in all processes.
+
+        :return: The new data generation.
+        """
+        stmt = pg_insert(DataVersion).values(id=DataVersion.SINGLETON_ID, generation=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DataVersion.id], set_={"generation": DataVersion.generation + 1}
+        ).returning(DataVersion.generation)
+        result = await self.session.execute(stmt)
+        generation = result.scalar_one()
+        await self.session.commit()
+        data_generation.update(generation)
+        return generation
 
     async def get_cohort(self, name: str) -> Cohort:
         """Retrieve a cohort metadata from the database.
@@ -74,108 +436,431 @@ class PostgreSQLRepository:
             raise ValueError(f"Cohort '{name}' not found.")
         return cohort
 
+    @cached
     async def get_concepts(
         self, cohort_name: Optional[str] = None, source_type: Optional[ConceptSource] = None
-    ) -> list[Concept]:
+    ) -> tuple[Row, ...]:
         """Retrieve all concepts from the database.
 
         :param cohort_name: Optional name of a cohort, defaults to None.
         :param source_type: Optional source type of concept, defaults to None.
-        :return: List of all concepts.
+        :return: Rows of all concepts with the columns of the concept table as attributes.
         """
-        query = select(Concept)
+        query = select(*Concept.__table__.columns)
         if cohort_name:
-            cohort = await self.get_cohort(cohort_name)
-            query = query.filter_by(cohort_id=cohort.id)
+            query = query.filter_by(cohort_id=await self._resolve_cohort_id(cohort_name))
         if source_type:
             query = query.filter_by(source_type=source_type)
 
         result = await self.session.execute(query)
-        return list(result.scalars().all())
+        return tuple(result.all())
 
-    async def get_modalities(self) -> list[str]:
+    @cached
+    async def get_modalities(self) -> tuple[str, ...]:
         """Retrieve all unique modalities from the mapping table.
 
-        :return: List of unique modality names.
+        :return: Tuple of unique modality names.
         """
         result = await self.session.execute(select(Mapping.modality).distinct().order_by(Mapping.modality))
-        return list(result.scalars().all())
+        return tuple(result.scalars().all())
 
     async def get_longitudinal_measurements(
-        self, variable: Optional[str] = None, cohort_name: Optional[str] = None
-    ) -> list[LongitudinalMeasurement]:
+        self,
+        variable: Optional[str] = None,
+        cohort_name: Optional[str] = None,
+        after: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> list[dict]:
         """Retrieve all longitudinal measurements
 
         :param variable: Optional name of a variable, defaults to None.
         :param cohort_name: Optional name of a cohort, defaults to None.
+        :param after: Optional keyset cursor, only measurements with a larger id are returned, defaults to None.
+        :param limit: Optional maximum number of measurements ordered by id, defaults to None.
         :return: List of all longitudinal measurements in the database.
         """
-        query = select(LongitudinalMeasurement).options(selectinload(LongitudinalMeasurement.cohort))
+        query = await self._longitudinal_measurements_query(
+            self._longitudinal_select(),
+            variable,
+            cohort_name,
+            after,
+            limit,
+        )
+        result = await self.session.execute(query)
+        return [dict(row) for row in result.mappings()]
+
+    async def stream_longitudinal_measurements(
+        self,
+        variable: Optional[str] = None,
+        cohort_name: Optional[str] = None,
+        after: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[dict]:
+        """Stream longitudinal measurements from a server-side cursor.
+
+        The query is executed before returning, so unknown cohorts raise before the first row is consumed.
+
+        :param variable: Optional name of a variable, defaults to None.
+        :param cohort_name: Optional name of a cohort, defaults to None.
+        :param after: Optional keyset cursor, only measurements with a larger id are returned, defaults to None.
+        :param limit: Optional maximum number of measurements ordered by id, defaults to None.
+        :return: Asynchronous iterator over the longitudinal measurements.
+        """
+        query = await self._longitudinal_measurements_query(
+            self._longitudinal_select(),
+            variable,
+            cohort_name,
+            after,
+            limit,
+        )
+        result = await self.session.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        return (dict(row) async for row in result.mappings())
+
+    async def export_longitudinal_measurements(
+        self,
+        variable: Optional[str] = None,
+        cohort_name: Optional[str] = None,
+        after: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> pa.Table:
+        """Export longitudinal measurements as a columnar Arrow table.
+
+        :param variable: Optional name of a variable, defaults to None.
+        :param cohort_name: Optional name of a cohort, defaults to None.
+        :param after: Optional keyset cursor, only measurements with a larger id are returned, defaults to None.
+        :param limit: Optional maximum number of measurements ordered by id, defaults to None.
+        :return: Arrow table with the columns of the longitudinal measurement responses.
+        """
+        query = await self._longitudinal_measurements_query(
+            self._longitudinal_select(),
+            variable,
+            cohort_name,
+            after,
+            limit,
+        )
+        return await self._copy_to_arrow(
+            query,
+            {
+                "id": pa.int64(),
+                "months": pa.float64(),
+                "variable": pa.string(),
+                "patientCount": pa.int64(),
+                "totalPatientCount": pa.int64(),
+                "cohort": pa.string(),
+            },
+        )
 
+    async def _longitudinal_measurements_query(
+        self,
+        query: Select,
+        variable: Optional[str],
+        cohort_name: Optional[str],
+        after: Optional[int],
+        limit: Optional[int],
+    ) -> Select:
+        """Apply the longitudinal measurement filters and optional keyset pagination to a query."""
         if variable:
             query = query.filter(LongitudinalMeasurement.variable == variable)
         if cohort_name:
-            cohort = await self.get_cohort(cohort_name)
-            query = query.filter(LongitudinalMeasurement.cohort_id == cohort.id)
-
-        result = await self.session.execute(query)
-        longitudinal_measurements = result.scalars().all()
+            query = query.filter(LongitudinalMeasurement.cohort_id == await self._resolve_cohort_id(cohort_name))
+        return _paginate(query, LongitudinalMeasurement.id, after, limit)
 
-        results = []
-        for lm in longitudinal_measurements:
-            results.append(
-                {
-                    "id": lm.id,
-                    "months": lm.months,
-                    "variable": lm.variable,
-                    "patientCount": lm.patient_count,
-                    "totalPatientCount": lm.total_patient_count,
-                    "cohort": lm.cohort.name if lm.cohort else None,  # relationship
-                }
-            )
-        return results
+    @staticmethod
+    def _longitudinal_select() -> Select:
+        """Select the columns of the longitudinal measurement responses, with the cohort name joined in.
 
-    async def get_longitudinal_measurement_variables(self) -> list[str]:
+        Plain rows are returned instead of entities, which skips identity map hydration and the relationship load.
+        """
+        return select(
+            LongitudinalMeasurement.id,
+            LongitudinalMeasurement.months,
+            LongitudinalMeasurement.variable,
+            LongitudinalMeasurement.patient_count.label("patientCount"),
+            LongitudinalMeasurement.total_patient_count.label("totalPatientCount"),
+            Cohort.name.label("cohort"),
+        ).join(Cohort, Cohort.id == LongitudinalMeasurement.cohort_id)
+
+    @cached
+    async def get_longitudinal_measurement_variables(self) -> tuple[str, ...]:
         """Retrieve all unique longitudinal measurement variables from the LongitudinalMeasurement table.
 
-        :return: List of unique longitudinal measurement varialbes.
+        :return: Tuple of unique longitudinal measurement varialbes.
         """
-        result = await self.session.execute(
-            select(LongitudinalMeasurement.variable).distinct().order_by(LongitudinalMeasurement.variable)
-        )
-        return list(result.scalars().all())
+        result = await self.session.execute(_distinct_values(LongitudinalMeasurement.variable))
+        return tuple(result.scalars().all())
 
     async def get_biomarker_measurements(
-        self, variable: Optional[str] = None, cohort_name: Optional[str] = None, diagnosis: Optional[str] = None
+        self,
+        variable: Optional[str] = None,
+        cohort_name: Optional[str] = None,
+        diagnosis: Optional[str] = None,
+        after: Optional[int] = None,
+        limit: Optional[int] = None,
     ) -> list[BiomarkerMeasurement]:
         """Retrieve all biomarker measurements
 
         :param variable: Optional name of a variable, defaults to None.
         :param cohort_name: Optional name of a cohort, defaults to None.
         :param diagnosis: Optional diagnosis of participants, defaults to None.
+        :param after: Optional keyset cursor, only measurements with a larger id are returned, defaults to None.
+        :param limit: Optional maximum number of measurements ordered by id, defaults to None.
         :return: List of all biomarker measurements in the database.
         """
-        query = select(BiomarkerMeasurement)
+        query = await self._biomarker_measurements_query(
+            select(BiomarkerMeasurement), variable, cohort_name, diagnosis, after, limit
+        )
+        result = await self.session.execute(query)
+        return list(result.scalars().all())
+
+    async def stream_biomarker_values(
+        self,
+        variable: Optional[str] = None,
+        cohort_name: Optional[str] = None,
+        diagnosis: Optional[str] = None,
+        after: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[float]:
+        """Stream the values of biomarker measurements from a server-side cursor.
+
+        The query is executed before returning, so unknown cohorts raise before the first value is consumed.
+
+        :param variable: Optional name of a variable, defaults to None.
+        :param cohort_name: Optional name of a cohort, defaults to None.
+        :param diagnosis: Optional diagnosis of participants, defaults to None.
+        :param after: Optional keyset cursor, only measurements with a larger id are returned, defaults to None.
+        :param limit: Optional maximum number of measurements ordered by id, defaults to None.
+        :return: Asynchronous iterator over the measured values.
+        """
+        query = await self._biomarker_measurements_query(
+            select(BiomarkerMeasurement.measurement), variable, cohort_name, diagnosis, after, limit
+        )
+        return await self.session.stream_scalars(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+
+    async def export_biomarker_measurements(
+        self,
+        variable: Optional[str] = None,
+        cohort_name: Optional[str] = None,
+        diagnosis: Optional[str] = None,
+        after: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> pa.Table:
+        """Export biomarker measurements as a columnar Arrow table.
+
+        :param variable: Optional name of a variable, defaults to None.
+        :param cohort_name: Optional name of a cohort, defaults to None.
+        :param diagnosis: Optional diagnosis of participants, defaults to None.
+        :param after: Optional keyset cursor, only measurements with a larger id are returned, defaults to None.
+        :param limit: Optional maximum number of measurements ordered by id, defaults to None.
+        :return: Arrow table with the `id` and `measurement` columns.
+        """
+        query = await self._biomarker_measurements_query(
+            select(BiomarkerMeasurement.id, BiomarkerMeasurement.measurement),
+            variable,
+            cohort_name,
+            diagnosis,
+            after,
+            limit,
+        )
+        return await self._copy_to_arrow(query, {"id": pa.int64(), "measurement": pa.float64()})
+
+    async def _copy_to_arrow(self, query: Select, column_types: dict[str, pa.DataType]) -> pa.Table:
+        """Run a query through PostgreSQL's COPY and parse the result into an Arrow table.
+
+        The rows are transferred as CSV and decoded by Arrow's native reader, so no Python object is created
+        per row.
+
+        :param query: Query to export, its column labels become the column names.
+        :param column_types: Arrow types of the selected columns.
+        :return: Arrow table with the query result.
+        """
+        compiled = query.compile(dialect=self.session.get_bind().dialect)
+        connection = await self.session.connection()
+        raw_connection = await connection.get_raw_connection()
+
+        buffer = io.BytesIO()
+        async with raw_connection.driver_connection.cursor() as cursor:
+            async with cursor.copy(f"COPY ({compiled}) TO STDOUT (FORMAT csv, HEADER)", compiled.params) as copy:
+                async for chunk in copy:
+                    buffer.write(chunk)
+
+        buffer.seek(0)
+        return pa_csv.read_csv(buffer, convert_options=pa_csv.ConvertOptions(column_types=column_types))
+
+    async def _biomarker_measurements_query(
+        self,
+        query: Select,
+        variable: Optional[str],
+        cohort_name: Optional[str],
+        diagnosis: Optional[str],
+        after: Optional[int],
+        limit: Optional[int],
+    ) -> Select:
+        """Apply the biomarker measurement filters and optional keyset pagination to a query."""
         if variable:
             query = query.filter(BiomarkerMeasurement.variable == variable)
         if cohort_name:
-            cohort = await self.get_cohort(cohort_name)
-            query = query.filter(BiomarkerMeasurement.cohort_id == cohort.id)
+            query = query.filter(BiomarkerMeasurement.cohort_id == await self._resolve_cohort_id(cohort_name))
         if diagnosis:
             query = query.filter(BiomarkerMeasurement.diagnosis == diagnosis)
+        return _paginate(query, BiomarkerMeasurement.id, after, limit)
 
-        result = await self.session.execute(query)
-        return list(result.scalars().all())
+    async def get_biomarker_distribution(
+        self,
+        variable: str,
+        cohort_name: str,
+        diagnosis: Optional[str] = None,
+        bins: int = 30,
+        lower: Optional[float] = None,
+        upper: Optional[float] = None,
+        kde_points: Optional[int] = None,
+    ) -> dict:
+        """Summarize the distribution of a biomarker without loading the individual measurements.
+
+        Summary statistics, box plot whiskers and histogram counts are aggregated by PostgreSQL, so the
+        result has a fixed size regardless of the number of participants.
 
-    async def get_biomarker_variables(self) -> list[str]:
-        """Retrieve all unique biomarker variables from the BiomarkerMeasurement table.
+        :param variable: Name of the biomarker variable.
+        :param cohort_name: Name of the cohort.
+        :param diagnosis: Optional diagnosis of participants, defaults to None.
+        :param bins: Number of equal-width histogram bins, defaults to 30.
+        :param lower: Lower edge of the histogram range, defaults to the smallest measurement.
+        :param upper: Upper edge of the histogram range, defaults to the largest measurement.
+        :param kde_points: Number of grid points of the kernel density estimate, defaults to None (no estimate).
+        :raises EmptyRangeError: If a given edge is not below the other edge, given or taken from the measurements.
+        :return: Dictionary with summary statistics, box plot values, histogram and optional density estimate.
+        """
+        measurement = BiomarkerMeasurement.measurement
+        cohort_id = await self._resolve_cohort_id(cohort_name)
+        conditions = [BiomarkerMeasurement.variable == variable, BiomarkerMeasurement.cohort_id == cohort_id]
+        if diagnosis:
+            conditions.append(BiomarkerMeasurement.diagnosis == diagnosis)
 
-        :return: List of unique biomarker names.
+        result = await self.session.execute(
+            select(
+                func.count(measurement),
+                func.avg(measurement),
+                func.stddev_samp(measurement),
+                func.min(measurement),
+                func.max(measurement),
+                func.percentile_cont(0.25).within_group(measurement),
+                func.percentile_cont(0.5).within_group(measurement),
+                func.percentile_cont(0.75).within_group(measurement),
+            ).where(*conditions)
+        )
+        count, mean, std, minimum, maximum, q1, median, q3 = result.one()
+
+        distribution = {
+            "count": count,
+            "mean": mean,
+            "std": std,
+            "min": minimum,
+            "max": maximum,
+            "q1": q1,
+            "median": median,
+            "q3": q3,
+            "lowerWhisker": None,
+            "upperWhisker": None,
+            "outliers": 0,
+            "histogram": {"edges": [], "counts": []},
+            "kde": None,
+        }
+        if count == 0:
+            return distribution
+
+        # Tukey whiskers: the most extreme measurements within 1.5 IQR of the quartiles
+        lower_fence = q1 - 1.5 * (q3 - q1)
+        upper_fence = q3 + 1.5 * (q3 - q1)
+        result = await self.session.execute(
+            select(
+                func.min(measurement).filter(measurement >= lower_fence),
+                func.max(measurement).filter(measurement <= upper_fence),
+                func.count().filter(or_(measurement < lower_fence, measurement > upper_fence)),
+            ).where(*conditions)
+        )
+        distribution["lowerWhisker"], distribution["upperWhisker"], distribution["outliers"] = result.one()
+
+        # A single given edge may lie beyond the other end of the data
+        lower_edge = minimum if lower is None else lower
+        upper_edge = maximum if upper is None else upper
+        if (lower is not None or upper is not None) and lower_edge >= upper_edge:
+            raise EmptyRangeError(
+                f"'lower' must be smaller than 'upper', the histogram range is [{lower_edge}, {upper_edge}]."
+            )
+
+        edges, counts = await self._histogram(measurement, conditions, bins, lower_edge, upper_edge)
+        distribution["histogram"] = {"edges": edges.tolist(), "counts": counts.tolist()}
+
+        if kde_points:
+            distribution["kde"] = await self._kernel_density(
+                measurement, conditions, count, std, q3 - q1, minimum, maximum, kde_points, lower, upper
+            )
+
+        return distribution
+
+    async def _histogram(self, column, conditions: list, bins: int, lower: float, upper: float):
+        """Count the values of a column in equal-width bins between `lower` and `upper`.
+
+        Follows the NumPy convention: the last bin is closed on the right, values outside the range are ignored.
+
+        :return: Tuple of the bin edges and the bin counts as NumPy arrays.
         """
+        if lower == upper:
+            lower, upper = lower - 0.5, upper + 0.5
+
+        bucket = func.least(func.width_bucket(column, lower, upper, bins), bins)
         result = await self.session.execute(
-            select(BiomarkerMeasurement.variable).distinct().order_by(BiomarkerMeasurement.variable)
+            select(bucket, func.count())
+            .where(*conditions, column >= lower, column <= upper)
+            .group_by(bucket)
         )
-        return list(result.scalars().all())
+        counts = np.zeros(bins, dtype=np.int64)
+        for index, bucket_count in result.all():
+            counts[index - 1] = bucket_count
+        return np.linspace(lower, upper, bins + 1), counts
+
+    async def _kernel_density(
+        self,
+        column,
+        conditions: list,
+        count: int,
+        std: Optional[float],
+        iqr: float,
+        minimum: float,
+        maximum: float,
+        points: int,
+        lower: Optional[float] = None,
+        upper: Optional[float] = None,
+    ) -> dict:
+        """Gaussian kernel density estimate computed from finely binned counts.
+
+        Measurements are aggregated into `_KDE_BINS` bins in the database and the kernel is evaluated on the bin
+        centers, which keeps the transfer size constant. The bandwidth follows Silverman's rule of thumb.
+
+        :return: Dictionary with the evaluation grid `x`, the estimated `density` and the `bandwidth`.
+        """
+        spread = min(std or 0.0, iqr / 1.34) or std or abs(maximum - minimum) or 1.0
+        bandwidth = 0.9 * spread * count ** (-1 / 5)
+
+        edges, counts = await self._histogram(column, conditions, _KDE_BINS, minimum, maximum)
+        centers = (edges[:-1] + edges[1:]) / 2
+
+        grid = np.linspace(
+            minimum - 3 * bandwidth if lower is None else lower,
+            maximum + 3 * bandwidth if upper is None else upper,
+            points,
+        )
+        kernel = np.exp(-0.5 * ((grid[:, None] - centers[None, :]) / bandwidth) ** 2)
+        density = kernel @ counts / (count * bandwidth * np.sqrt(2 * np.pi))
+        return {"x": grid.tolist(), "density": density.tolist(), "bandwidth": bandwidth}
+
+    @cached
+    async def get_biomarker_variables(self) -> tuple[str, ...]:
+        """Retrieve all unique biomarker variables from the BiomarkerMeasurement table.
+
+        :return: Tuple of unique biomarker names.
+        """
+        result = await self.session.execute(_distinct_values(BiomarkerMeasurement.variable))
+        return tuple(result.scalars().all())
 
     async def get_cohorts_for_biomarker(self, variable: str) -> list[str]:
         """Retrieve all unique cohort names for a biomarker from the BiomarkerMeasurement table.
@@ -209,12 +894,30 @@ class PostgreSQLRepository:
         )
         return list(result.scalars().all())
 
-    async def import_metadata(self, csv_data: bytes):
+    async def get_cohort_diagnoses_for_biomarkers(self, variables: list[str]) -> list[tuple[str, str, str]]:
+        """Retrieve all unique (cohort, diagnosis) pairs of the given biomarkers in a single grouped query.
+
+        :param variables: Names of the biomarker variables.
+        :return: List of (variable, cohort name, diagnosis) tuples ordered by variable, cohort and diagnosis.
+        """
+        result = await self.session.execute(
+            select(BiomarkerMeasurement.variable, Cohort.name, BiomarkerMeasurement.diagnosis)
+            .join(Cohort, Cohort.id == BiomarkerMeasurement.cohort_id)
+            .where(BiomarkerMeasurement.variable.in_(set(variables)))
+            .group_by(BiomarkerMeasurement.variable, Cohort.name, BiomarkerMeasurement.diagnosis)
+            .order_by(BiomarkerMeasurement.variable, Cohort.name, BiomarkerMeasurement.diagnosis)
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def import_metadata(self, csv_data: bytes | BinaryIO, replace: bool = False):
         """Import cohort metadata via a CSV file.
 
-        :param csv_data: Cohort metadata CSV file content in bytes.
+        :param csv_data: Cohort metadata CSV file content in bytes, or a binary file object to read it from.
+        :param replace: Update the metadata of existing cohorts instead of keeping it, defaults to False.
+            New cohorts clear the content hashes recorded by the imports of the other upload types, so their next
+            imports do not skip files with rows of the new cohorts.
         """
-        df = pd.read_csv(io.BytesIO(csv_data))
+        df = pd.read_csv(_csv_source(csv_data))
         required_columns = {
             "cohort",
             "participants",
@@ -259,13 +962,30 @@ class PostgreSQLRepository:
         if not cohorts_data:
             return
 
-        stmt = pg_insert(Cohort).values(cohorts_data).on_conflict_do_nothing(index_elements=["name"])
+        names = {cohort["name"] for cohort in cohorts_data}
+        result = await self.session.execute(select(Cohort.name).where(Cohort.name.in_(names)))
+        if names - set(result.scalars().all()):
+            # Rows of unknown cohorts were rejected by earlier imports, so unchanged files must be imported again
+            await self.session.execute(
+                delete(ImportManifest).where(ImportManifest.upload_type.in_(set(UPLOAD_TABLES) - {"metadata"}))
+            )
+
+        stmt = pg_insert(Cohort).values(cohorts_data)
+        if replace:
+            # Cohorts are updated in place, deleting them would delete their measurements as well
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["name"], set_={key: stmt.excluded[key] for key in cohorts_data[0] if key != "name"}
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=["name"])
         await self.session.execute(stmt)
         await self.session.commit()
+        self._import_cohort_map = None
+        await self.bump_data_generation()
 
     async def import_cdm(
         self,
-        csv_data: bytes,
+        csv_data: bytes | BinaryIO,
         modality: str,
         columns_to_ignore: list[str] = [
             "Feature",
@@ -277,264 +997,468 @@ class PostgreSQLRepository:
             "UK Biobank",
             "Rank",
         ],
+        replace: bool = False,
     ):
-        """Import a CDM modality mapping file (e.g., Clinical.csv)
+        """Import a CDM modality mapping file (e.g., Clinical.csv) within a single transaction.
 
-        :param csv_data: Modality CSV file content in bytes.
+        :param csv_data: Modality CSV file content in bytes, or a binary file object to read it from.
         :param modality: Modality of the mappings.
+        :param replace: Delete the previous mappings of the modality first, defaults to False.
         """
-        df = pd.read_csv(io.BytesIO(csv_data))
-        cohorts = await self.get_cohorts()
-        cohort_map = {c.name: c.id for c in cohorts}
+        df = pd.read_csv(_csv_source(csv_data), dtype=str)
+        cohort_map = await self.load_cohort_map()
+
+        df["Feature"] = df["Feature"].str.strip()
+        df = df[df["Feature"].fillna("") != ""]
+        cohort_columns = [c for c in df.columns if c not in columns_to_ignore and c in cohort_map]
+
+        # One row per (CDM variable, cohort, cohort variable), cells may list several comma-separated variables
+        pairs = df.melt(id_vars="Feature", value_vars=cohort_columns, var_name="cohort", value_name="variable")
+        pairs["variable"] = pairs["variable"].str.split(",")
+        pairs = pairs.explode("variable")
+        pairs["variable"] = pairs["variable"].str.strip()
+        pairs = pairs[pairs["variable"].fillna("") != ""]
+        pairs["cohort_id"] = pairs["cohort"].map(cohort_map)
+
+        if replace:
+            await self.session.execute(delete(Mapping).where(Mapping.modality == modality))
+            # Cohort variables only mapped by the replaced mappings are no longer part of the CDM
+            await self.session.execute(
+                delete(Concept).where(
+                    Concept.source_type == ConceptSource.COHORT,
+                    ~select(Mapping.id).where(Mapping.target_id == Concept.id).exists(),
+                )
+            )
 
-        cdm_vars = set(df["Feature"].dropna().astype(str).str.strip())
-        cdm_concepts_data = [
-            {"variable": var, "source_type": ConceptSource.CDM, "cohort_id": None} for var in cdm_vars if var
-        ]
+        cdm_concept_map = await self._upsert_cdm_concepts(df["Feature"].unique().tolist())
 
-        if cdm_concepts_data:
-            stmt = (
-                pg_insert(Concept)
-                .values(cdm_concepts_data)
-                .on_conflict_do_nothing(constraint="uq_variable_source_cohort")
-            )
-            await self.session.execute(stmt)
-            await self.session.commit()
+        cohort_concepts = pairs[["variable", "cohort_id"]].drop_duplicates()
+        stmt = pg_insert(Concept).from_select(
+            ["variable", "cohort_id", "source_type"],
+            _unnest(
+                variable=(cohort_concepts["variable"].tolist(), String),
+                cohort_id=(cohort_concepts["cohort_id"].tolist(), Integer),
+            ).add_columns(literal(ConceptSource.COHORT, Concept.source_type.type)),
+        )
+        # Updating existing concepts to themselves makes RETURNING include them
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_variable_source_cohort", set_={"variable": stmt.excluded.variable}
+        ).returning(Concept.variable, Concept.cohort_id, Concept.id)
+        result = await self.session.execute(stmt)
+        cohort_concept_map = {(variable, cohort_id): id for variable, cohort_id, id in result.all()}
 
-        result = await self.session.execute(
-            select(Concept).filter(Concept.source_type == ConceptSource.CDM, Concept.variable.in_(cdm_vars))
-        )
-        cdm_concept_map = {c.variable: c.id for c in result.scalars().all()}
-
-        cohort_concepts_to_create = []
-        raw_mappings = []
-        valid_cohort_columns = [c for c in df.columns if c not in columns_to_ignore and c in cohort_map]
-        col_to_idx = {name: i for i, name in enumerate(df.columns)}
-        feature_idx = col_to_idx["Feature"]
-
-        for row in df.itertuples(index=False, name=None):
-            cdm_var = str(row[feature_idx]).strip()
-            if not cdm_var or cdm_var not in cdm_concept_map:
-                continue
-
-            for col in valid_cohort_columns:
-                cell_value = row[col_to_idx[col]]
-                if pd.isna(cell_value) or str(cell_value).strip() == "":
-                    continue
-
-                # Split comma-separated variables
-                values = [v.strip() for v in str(cell_value).split(",") if v.strip()]
-                for val in values:
-                    cohort_concepts_to_create.append(
-                        {"variable": val, "source_type": ConceptSource.COHORT, "cohort_id": cohort_map[col]}
-                    )
-                    raw_mappings.append((cdm_var, col, val))
+        mappings = pd.DataFrame(
+            {
+                "source_id": pairs["Feature"].map(cdm_concept_map),
+                "target_id": [cohort_concept_map[key] for key in zip(pairs["variable"], pairs["cohort_id"])],
+            }
+        ).drop_duplicates()
+        stmt = pg_insert(Mapping).from_select(
+            ["source_id", "target_id", "modality"],
+            _unnest(
+                source_id=(mappings["source_id"].tolist(), Integer),
+                target_id=(mappings["target_id"].tolist(), Integer),
+            ).add_columns(literal(modality, String)),
+        )
+        await self.session.execute(stmt.on_conflict_do_nothing(constraint="uq_mapping_source_target_modality"))
 
-        if cohort_concepts_to_create:
-            # Deduplicate dicts (concepts might appear multiple times in CSV)
-            # A set of tuples is used for deduplication
-            unique_concepts = {(d["variable"], d["cohort_id"]): d for d in cohort_concepts_to_create}.values()
-            stmt = (
-                pg_insert(Concept)
-                .values(list(unique_concepts))
-                .on_conflict_do_nothing(constraint="uq_variable_source_cohort")
-            )
-            await self.session.execute(stmt)
-            await self.session.commit()
+        await self._store_chord_diagram(modality, await self._build_chord_diagram(modality))
+        # Commits the concepts, mappings and chord diagram together
+        await self.bump_data_generation()
+
+    async def _upsert_cdm_concepts(self, variables: list[str]) -> dict[str, int]:
+        """Get the ids of CDM concepts, creating the missing ones.
 
-        # Fetch IDs for Cohort Concepts
-        cohort_ids_involved = [cohort_map[c] for c in valid_cohort_columns]
+        CDM concepts have no cohort, and NULL never conflicts on the unique constraint, so existing concepts are
+        looked up instead of relying on ON CONFLICT.
 
+        :param variables: Variables of the CDM concepts.
+        :return: Mapping of the variables to their concept ids.
+        """
         result = await self.session.execute(
-            select(Concept).filter(
-                Concept.cohort_id.in_(cohort_ids_involved), Concept.source_type == ConceptSource.COHORT
+            select(Concept.variable, func.min(Concept.id))
+            .where(Concept.source_type == ConceptSource.CDM, Concept.variable.in_(variables))
+            .group_by(Concept.variable)
+        )
+        concept_map = dict(result.all())
+
+        missing = [v for v in variables if v not in concept_map]
+        if missing:
+            stmt = pg_insert(Concept).from_select(
+                ["variable", "source_type"],
+                _unnest(variable=(missing, String)).add_columns(literal(ConceptSource.CDM, Concept.source_type.type)),
             )
+            result = await self.session.execute(stmt.returning(Concept.variable, Concept.id))
+            concept_map.update(result.all())
+        return concept_map
+
+    async def import_longitudinal_measurements(
+        self, csv_data: bytes | BinaryIO, variable_name: str, use_copy: bool = True, replace: bool = False
+    ) -> ImportStats:
+        """Import longitudinal measurements from a CSV file.
+
+        :param csv_data: Longitudinal measurements CSV file content in bytes, or a binary file object to stream it from.
+        :param variable_name: Name of the imported variable.
+        :param use_copy: Bulk load through COPY and a staging table instead of INSERT statements, defaults to True.
+        :param replace: Delete the previous measurements of the variable first, defaults to False.
+        :return: Number of inserted measurements and of measurements skipped as duplicates, and the rejected rows.
+        """
+        return await self._import_measurements(
+            csv_data,
+            variable_name,
+            LONGITUDINAL_COLUMNS,
+            _prepare_longitudinal_records,
+            LongitudinalMeasurement,
+            "uq_variable_months_cohort",
+            use_copy,
+            replace,
         )
-        target_concept_map = {(c.variable, c.cohort_id): c.id for c in result.scalars().all()}
 
-        mappings_data = []
-        for cdm_var, cohort_name, cohort_var in raw_mappings:
-            cdm_id = cdm_concept_map.get(cdm_var)
-            cohort_id = cohort_map.get(cohort_name)
-            target_id = target_concept_map.get((cohort_var, cohort_id))
+    async def import_biomarker_measurements(
+        self, csv_data: bytes | BinaryIO, variable_name: str, use_copy: bool = True, replace: bool = False
+    ) -> ImportStats:
+        """Import biomarker measurements from a CSV file.
+
+        :param csv_data: Biomarker measurements CSV file content in bytes, or a binary file object to stream it from.
+        :param variable_name: Name of the imported variable.
+        :param use_copy: Bulk load through COPY and a staging table instead of INSERT statements, defaults to True.
+        :param replace: Delete the previous measurements of the variable first, defaults to False.
+        :return: Number of inserted measurements and of measurements skipped as duplicates, and the rejected rows.
+        """
+        return await self._import_measurements(
+            csv_data,
+            variable_name,
+            BIOMARKER_COLUMNS,
+            _prepare_biomarker_records,
+            BiomarkerMeasurement,
+            "uq_participant_cohort_variable",
+            use_copy,
+            replace,
+        )
 
-            if cdm_id and target_id:
-                mappings_data.append({"source_id": cdm_id, "target_id": target_id, "modality": modality})
+    async def load_longitudinal_measurements(
+        self, measurements: dict[str, pd.DataFrame], use_copy: bool = True, replace: bool = True
+    ) -> ImportStats:
+        """Load longitudinal measurements of several variables from data frames, e.g. the output of the preprocessing.
 
-        if mappings_data:
-            # Deduplicate mappings
-            unique_mappings = {(m["source_id"], m["target_id"], m["modality"]): m for m in mappings_data}.values()
-            stmt = (
-                pg_insert(Mapping)
-                .values(list(unique_mappings))
-                .on_conflict_do_nothing(constraint="uq_mapping_source_target_modality")
-            )
-            await self.session.execute(stmt)
-            await self.session.commit()
+        :param measurements: Data frames with the columns of a longitudinal measurements CSV file, by variable name.
+        :param use_copy: Bulk load through COPY and a staging table instead of INSERT statements, defaults to True.
+        :param replace: Delete the previous measurements of the variables first, defaults to True.
+        :raises ValueError: If a data frame lacks a column of the CSV files, before any measurement was deleted.
+        :return: Number of inserted measurements and of measurements skipped as duplicates, and the rejected rows.
+        """
+        return await self._load_measurements(
+            measurements,
+            "longitudinal",
+            LONGITUDINAL_COLUMNS,
+            _prepare_longitudinal_records,
+            LongitudinalMeasurement,
+            "uq_variable_months_cohort",
+            use_copy,
+            replace,
+        )
 
-    async def import_longitudinal_measurements(self, csv_data: bytes, variable_name: str):
-        """Import longitudinal measurements from a CSV file.
+    async def load_biomarker_measurements(
+        self, measurements: dict[str, pd.DataFrame], use_copy: bool = True, replace: bool = True
+    ) -> ImportStats:
+        """Load biomarker measurements of several variables from data frames, e.g. the output of the preprocessing.
 
-        :param csv_data: Longitudinal measurements CSV file content in bytes.
+        :param measurements: Data frames with the columns of a biomarker measurements CSV file, by variable name.
+        :param use_copy: Bulk load through COPY and a staging table instead of INSERT statements, defaults to True.
+        :param replace: Delete the previous measurements of the variables first, defaults to True.
+        :raises ValueError: If a data frame lacks a column of the CSV files, before any measurement was deleted.
+        :return: Number of inserted measurements and of measurements skipped as duplicates, and the rejected rows.
         """
-        df = pd.read_csv(io.BytesIO(csv_data))
-        required_columns = {"months", "cohort", "patientCount", "totalPatientCount"}
-        if required_columns - set(df.columns):
-            raise ValueError(f"Missing columns: {required_columns - set(df.columns)}")
+        return await self._load_measurements(
+            measurements,
+            "biomarkers",
+            BIOMARKER_COLUMNS,
+            _prepare_biomarker_records,
+            BiomarkerMeasurement,
+            "uq_participant_cohort_variable",
+            use_copy,
+            replace,
+        )
 
-        cohorts = await self.get_cohorts()
-        cohort_map = {c.name: c.id for c in cohorts}
+    async def _import_measurements(
+        self,
+        csv_data: bytes | BinaryIO,
+        variable_name: str,
+        required_columns: set[str],
+        prepare: Callable[[pd.DataFrame, str, dict[str, int]], tuple[pd.DataFrame, pd.DataFrame]],
+        model: type[Base],
+        constraint: str,
+        use_copy: bool,
+        replace: bool,
+    ) -> ImportStats:
+        """Import a measurement CSV file in chunks of `IMPORT_CHUNK_ROWS` rows within a single transaction.
+
+        Several files can be imported concurrently by repositories with separate sessions.
+
+        :param csv_data: CSV file content in bytes, or a binary file object to stream it from.
+        :param variable_name: Name of the imported variable.
+        :param required_columns: Columns the CSV file must contain.
+        :param prepare: Function splitting a chunk into the table records and the rejected rows.
+        :param model: Model of the target table.
+        :param constraint: Name of the unique constraint duplicates are detected on.
+        :param use_copy: Bulk load through COPY and a staging table instead of batched INSERT statements.
+        :param replace: Delete the previous measurements of the variable first.
+        :return: Number of inserted measurements and of measurements skipped as duplicates, and the rejected rows.
+        """
+        cohort_map = await self.load_cohort_map()
+        inserted = total = 0
+        rejected = []
+        if replace:
+            await self.session.execute(delete(model).where(model.variable == variable_name))
+
+        # Parsing and converting run in a thread so they overlap with the database I/O of concurrent imports.
+        # Nullable dtypes keep integer columns with gaps as integers, so rejected rows are reported as written.
+        with await asyncio.to_thread(
+            pd.read_csv, _csv_source(csv_data), dtype_backend="numpy_nullable", chunksize=IMPORT_CHUNK_ROWS
+        ) as chunks:
+            while (df := await asyncio.to_thread(next, chunks, None)) is not None:
+                if required_columns - set(df.columns):
+                    raise ValueError(f"Missing columns: {required_columns - set(df.columns)}")
+
+                records, chunk_rejected = await asyncio.to_thread(prepare, df, variable_name, cohort_map)
+                rejected.append(chunk_rejected)
+                if not records.empty:
+                    inserted += await self._merge_records(model, records, constraint, use_copy)
+                    total += len(records)
+
+        stats = ImportStats(
+            inserted=inserted,
+            skipped=total - inserted,
+            rejected=pd.concat(rejected) if rejected else pd.DataFrame(columns=["line", "reason"]),
+        )
+        if not total and not replace:
+            return stats
 
-        batch_data = []
-        for row in df.itertuples(index=False):
-            cohort_name = str(row.cohort).strip()
-            if cohort_name not in cohort_map:
-                continue
+        await self.session.commit()
+        await self.bump_data_generation()
+        return stats
 
-            batch_data.append(
-                {
-                    "variable": variable_name,
-                    "months": cast(float, row.months),
-                    "cohort_id": cohort_map[cohort_name],
-                    "patient_count": cast(int, row.patientCount),
-                    "total_patient_count": cast(int, row.totalPatientCount),
-                }
+    async def _load_measurements(
+        self,
+        measurements: dict[str, pd.DataFrame],
+        upload_type: str,
+        required_columns: set[str],
+        prepare: Callable[[pd.DataFrame, str, dict[str, int]], tuple[pd.DataFrame, pd.DataFrame]],
+        model: type[Base],
+        constraint: str,
+        use_copy: bool,
+        replace: bool,
+    ) -> ImportStats:
+        """Load the measurements of several variables from data frames within a single transaction.
+
+        Consecutive variables are prepared and merged together in batches of at least `IMPORT_CHUNK_ROWS` rows. The
+        manifest entries of the variables are removed, so uploads of their files are imported again afterwards.
+
+        :param measurements: Data frames with the columns of the measurement CSV files, by variable name.
+        :param upload_type: Upload type of the measurements.
+        :param required_columns: Columns every data frame must contain.
+        :param prepare: Function splitting a data frame into the table records and the rejected rows.
+        :param model: Model of the target table.
+        :param constraint: Name of the unique constraint duplicates are detected on.
+        :param use_copy: Bulk load through COPY and a staging table instead of batched INSERT statements.
+        :param replace: Delete the previous measurements of the variables first.
+        :raises ValueError: If a data frame lacks a required column, before any measurement was deleted.
+        :return: Number of inserted measurements and of measurements skipped as duplicates, and the rejected rows
+            with their variable.
+        """
+        for variable_name, df in measurements.items():
+            if required_columns - set(df.columns):
+                raise ValueError(f"Missing columns of '{variable_name}': {required_columns - set(df.columns)}")
+
+        cohort_map = await self.load_cohort_map()
+        inserted = total = 0
+        rejected = []
+        batch: dict[str, pd.DataFrame] = {}
+        if replace:
+            await self.session.execute(delete(model).where(model.variable.in_(list(measurements))))
+        await self.session.execute(
+            delete(ImportManifest).where(
+                ImportManifest.upload_type == upload_type, ImportManifest.name.in_(list(measurements))
             )
+        )
 
-        if not batch_data:
-            return
+        async def merge_batch():
+            nonlocal inserted, total
+            # Prepared at once, as preparing many small data frames one by one is dominated by overhead
+            df = pd.concat(batch, names=["variable", "row"]).reset_index()
+            batch.clear()
+            records, batch_rejected = await asyncio.to_thread(
+                prepare, df.drop(columns=["variable", "row"]), "", cohort_map
+            )
+            records["variable"] = df["variable"]
+            if not batch_rejected.empty:
+                # Lines as in the CSV file of the variable
+                batch_rejected = batch_rejected.assign(line=df["row"] + 2)
+                batch_rejected.insert(0, "variable", df["variable"])
+                rejected.append(batch_rejected)
+            if not records.empty:
+                inserted += await self._merge_records(model, records, constraint, use_copy)
+                total += len(records)
+
+        for variable_name, df in measurements.items():
+            batch[variable_name] = df
+            if sum(map(len, batch.values())) >= IMPORT_CHUNK_ROWS:
+                await merge_batch()
+        if batch:
+            await merge_batch()
 
-        stmt = (
-            pg_insert(LongitudinalMeasurement)
-            .values(batch_data)
-            .on_conflict_do_nothing(constraint="uq_variable_months_cohort")
-        )
-        await self.session.execute(stmt)
         await self.session.commit()
+        await self.bump_data_generation()
+        return ImportStats(
+            inserted=inserted,
+            skipped=total - inserted,
+            rejected=(
+                pd.concat(rejected, ignore_index=True)
+                if rejected
+                else pd.DataFrame(columns=["variable", "line", "reason"])
+            ),
+        )
 
-    async def import_biomarker_measurements(self, csv_data: bytes, variable_name: str):
-        """Import biomarker measurements from a CSV file.
+    async def _merge_records(self, model: type[Base], records: pd.DataFrame, constraint: str, use_copy: bool) -> int:
+        """Insert records into the table of a model, skipping those that conflict on a unique constraint.
 
-        :param csv_data: Biomarker measurements CSV file content in bytes.
+        :param model: Model of the target table.
+        :param records: Records with one column per table column.
+        :param constraint: Name of the unique constraint duplicates are detected on.
+        :param use_copy: Bulk load through COPY and a staging table instead of batched INSERT statements.
+        :return: Number of inserted records.
         """
-        df = pd.read_csv(io.BytesIO(csv_data))
-        cohorts = await self.get_cohorts()
-        cohort_map = {c.name: c.id for c in cohorts}
+        if use_copy:
+            return await self._copy_merge(model.__table__, records, constraint)
 
-        records_to_insert = []
-        for row in df.itertuples(index=False):
-            cohort_name = str(getattr(row, "cohort", "")).strip()
-            if cohort_name not in cohort_map:
-                continue
-            try:
-                records_to_insert.append(
-                    {
-                        "variable": variable_name,
-                        "participant_id": int(getattr(row, "participantNumber", 0)),
-                        "cohort_id": cohort_map[cohort_name],
-                        "measurement": float(getattr(row, "measurement", 0.0)),
-                        "diagnosis": str(getattr(row, "diagnosis", "")),
-                    }
+        inserted = 0
+        for start in range(0, len(records), INSERT_BATCH_SIZE):
+            end = start + INSERT_BATCH_SIZE
+            stmt = (
+                pg_insert(model)
+                .values(records.iloc[start:end].to_dict("records"))
+                .on_conflict_do_nothing(constraint=constraint)
+                .execution_options(preserve_rowcount=True)
+            )
+            inserted += (await self.session.execute(stmt)).rowcount
+        return inserted
+
+    async def _copy_merge(self, target: Table, df: pd.DataFrame, constraint: str) -> int:
+        """Load a data frame with COPY FROM STDIN into a staging table and merge it into the target table.
+
+        The staging table is temporary and dropped once merged. Rows conflicting on the constraint, with existing
+        rows or with each other, are skipped by a single set-based INSERT ... SELECT.
+
+        :param target: Target table, the data frame columns must be a subset of its columns.
+        :param df: Rows to load.
+        :param constraint: Name of the unique constraint duplicates are detected on.
+        :return: Number of inserted rows.
+        """
+        staging = table(f"staging_{target.name}", *(column(name) for name in df.columns))
+        columns = ", ".join(df.columns)
+        await self.session.execute(
+            text(f"CREATE TEMPORARY TABLE {staging.name} AS SELECT {columns} FROM {target.name} WITH NO DATA")
+        )
+
+        connection = await self.session.connection()
+        raw_connection = await connection.get_raw_connection()
+        async with raw_connection.driver_connection.cursor() as cursor:
+            # Strings are quoted so empty values stay empty strings instead of becoming NULL
+            async with cursor.copy(f"COPY {staging.name} ({columns}) FROM STDIN (FORMAT csv)") as copy:
+                await copy.write(
+                    await asyncio.to_thread(
+                        df.to_csv, index=False, header=False, quoting=csv.QUOTE_NONNUMERIC, na_rep="NaN"
+                    )
                 )
-            except ValueError as e:
-                print(f"Skipping row due to data format error: {row}. Error: {e}")
-                continue
 
-        if not records_to_insert:
-            return
+        stmt = (
+            pg_insert(target)
+            .from_select(list(df.columns), select(staging))
+            .on_conflict_do_nothing(constraint=constraint)
+            .execution_options(preserve_rowcount=True)
+        )
+        result = await self.session.execute(stmt)
+        await self.session.execute(text(f"DROP TABLE {staging.name}"))
+        return result.rowcount
 
-        batch_size = 5000
-        for i in range(0, len(records_to_insert), batch_size):
-            batch = records_to_insert[i : i + batch_size]
-            stmt = (
-                pg_insert(BiomarkerMeasurement)
-                .values(batch)
-                .on_conflict_do_nothing(constraint="uq_participant_cohort_variable")
-            )
-            await self.session.execute(stmt)
+    async def get_chord_diagram(self, modality: str) -> dict:
+        """Retrieve the chord diagram data of a modality.
+
+        Diagrams are precomputed after each CDM import, or by `refresh_chord_diagram`. A diagram that has not been
+        stored, e.g. of mappings imported before diagrams were stored, is built from the current mappings without
+        storing it, so reads never write.
+
+        :param modality: The modality of the mappings.
+        :return: A dictionary containing the nodes and the links of the chord diagram.
+        """
+        result = await self.session.execute(select(ChordDiagram).filter_by(modality=modality))
+        chord_diagram = result.scalar_one_or_none()
+        if chord_diagram is not None:
+            return {"nodes": chord_diagram.nodes, "links": chord_diagram.links}
+        return await self._build_chord_diagram(modality)
+
+    async def refresh_chord_diagram(self, modality: str) -> dict:
+        """Rebuild the stored chord diagram of a modality from the current mappings.
+
+        :param modality: The modality of the mappings.
+        :return: A dictionary containing the nodes and the links of the chord diagram.
+        """
+        diagram = await self._build_chord_diagram(modality)
+        await self._store_chord_diagram(modality, diagram)
         await self.session.commit()
+        return diagram
+
+    async def _store_chord_diagram(self, modality: str, diagram: dict):
+        """Insert or replace the stored chord diagram of a modality and increment its version."""
+        stmt = pg_insert(ChordDiagram).values(modality=modality, version=1, **diagram)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ChordDiagram.modality],
+            set_={
+                "nodes": stmt.excluded.nodes,
+                "links": stmt.excluded.links,
+                "version": ChordDiagram.version + 1,
+            },
+        )
+        await self.session.execute(stmt)
 
-    async def get_chord_diagram(self, modality: str) -> dict:
+    def _chord_diagram_query(self, modality: Optional[str], cdm_side, study_side, direction: int):
+        """Select (CDM concept, mapping, study variable, cohort) rows for mappings in one direction."""
+        cdm_concept = aliased(Concept)
+        study_concept = aliased(Concept)
+        stmt = (
+            select(
+                cdm_concept.id.label("cdm_id"),
+                literal(direction).label("direction"),
+                Mapping.id.label("mapping_id"),
+                study_concept.variable,
+                Cohort.name,
+            )
+            .join(Mapping, cdm_side == cdm_concept.id)
+            .join(study_concept, study_side == study_concept.id)
+            .join(Cohort, Cohort.id == study_concept.cohort_id)
+            .where(cdm_concept.source_type == ConceptSource.CDM)
+        )
+        if modality is not None:
+            stmt = stmt.where(Mapping.modality == modality)
+        return stmt
+
+    async def _build_chord_diagram(self, modality: Optional[str]) -> dict:
         """Build a chord diagram data based on the current mappings.
 
         :param modality: The modality of the mappings.
         :return: A dictionary containing the nodes and the links of the chord diagram.
         """
-        stmt = (
-            select(Concept)
-            .filter(Concept.source_type == ConceptSource.CDM)
-            .options(
-                selectinload(Concept.mappings_as_source).selectinload(Mapping.target).selectinload(Concept.cohort),
-                selectinload(Concept.mappings_as_target).selectinload(Mapping.source).selectinload(Concept.cohort),
+        mapped = union_all(
+            self._chord_diagram_query(modality, Mapping.source_id, Mapping.target_id, 0),
+            self._chord_diagram_query(modality, Mapping.target_id, Mapping.source_id, 1),
+        ).subquery()
+        result = await self.session.execute(
+            select(mapped.c.cdm_id, mapped.c.variable, mapped.c.name).order_by(
+                mapped.c.cdm_id, mapped.c.direction, mapped.c.mapping_id
             )
         )
-        result = await self.session.execute(stmt)
-        cdm_concepts = result.scalars().all()
-
-        node_seen: set[tuple[str, str]] = set()  # (name, group)
-        link_seen: set[tuple[str, str]] = set()  # (min_name, max_name) for undirected
-        nodes: list[dict[str, str]] = []
-        links: list[dict[str, str]] = []
-
-        def add_node(name: str, group: str) -> None:
-            key = (name, group)
-            if key not in node_seen:
-                node_seen.add(key)
-                nodes.append({"name": name, "group": group})
-
-        def add_link(a: str, b: str) -> None:
-            s, t = (a, b) if a <= b else (b, a)  # undirected de-dupe
-            key = (s, t)
-            if s != t and key not in link_seen:
-                link_seen.add(key)
-                links.append({"source": s, "target": t})
-
-        for cdm in cdm_concepts:
-            # collect mapped study variables (label, study_name) for this CDM
-            study_vars: list[tuple[str, str]] = []
-
-            for m in cdm.mappings_as_source:
-                if modality is not None and m.modality != modality:
-                    continue
-                tgt = m.target
-                if tgt and tgt.cohort:
-                    label = (tgt.variable or "").strip()
-                    study = tgt.cohort.name
-                    if label and study:
-                        study_vars.append((label, study))
-
-            for m in cdm.mappings_as_target:
-                if modality is not None and m.modality != modality:
-                    continue
-                src = m.source
-                if src and src.cohort:
-                    label = (src.variable or "").strip()
-                    study = src.cohort.name
-                    if label and study:
-                        study_vars.append((label, study))
-
-            # de-dupe study vars
-            per_cdm_unique = list(dict.fromkeys(study_vars))
-
-            # skip CDM concepts that only map to a single cohort
-            unique_cohorts = {study for _, study in per_cdm_unique}
-            if len(unique_cohorts) < 2:
-                continue
-
-            # add nodes
-            for label, study in per_cdm_unique:
-                add_node(label, study)
-
-            # link every pair across different studies (via this CDM)
-            n = len(per_cdm_unique)
-            for i in range(n):
-                li, si = per_cdm_unique[i]
-                for j in range(i + 1, n):
-                    lj, sj = per_cdm_unique[j]
-                    if si != sj:
-                        add_link(li, lj)
-
-        return {"nodes": nodes, "links": links}
+
+        return _chord_diagram(result.all())
 
     async def rank_cohorts(self, variables: list[str]) -> pd.DataFrame:
         """Rank cohorts based on availability of requested CDM variables.
@@ -548,64 +1472,299 @@ class PostgreSQLRepository:
         if not variables:
             raise ValueError("The 'variables' list cannot be empty")
 
-        total_variables = len(variables)
+        mapping_counts = await self._count_cdm_mappings(variables)
         cohort_stats: dict[str, CohortStats] = defaultdict(lambda: CohortStats(found=0, missing=[]))
-
+        cohorts = await self.get_cohorts()
         for var in variables:
-            stmt = (
-                select(Concept)
-                .filter(Concept.variable == var, Concept.source_type == ConceptSource.CDM)
-                .options(
-                    selectinload(Concept.mappings_as_source).selectinload(Mapping.target).selectinload(Concept.cohort)
+            if var not in mapping_counts:
+                raise ValueError(f"Requested CDM variable '{var}' does not exist in the database.")
+
+            for cohort_name, count in mapping_counts[var].items():
+                cohort_stats[cohort_name]["found"] += count
+
+            for cohort in cohorts:
+                if cohort.name not in mapping_counts[var]:
+                    cohort_stats[cohort.name]["missing"].append(var)
+
+        return _cohort_ranking(cohort_stats, len(variables))
+
+    async def _count_cdm_mappings(self, variables: list[str]) -> dict[str, dict[str, int]]:
+        """Count the mappings of every requested CDM concept per cohort in a single grouped query.
+
+        :param variables: A list of CDM variable names.
+        :return: Number of mappings by cohort name, by CDM variable. Variables without any mapping have no counts,
+            unknown variables are missing.
+        """
+        # The outer joins keep concepts without any mapping so unknown variables can be told apart
+        cdm_concept = aliased(Concept)
+        target_concept = aliased(Concept)
+        stmt = (
+            select(cdm_concept.variable, Cohort.name, func.count(Mapping.id))
+            .select_from(cdm_concept)
+            .outerjoin(Mapping, Mapping.source_id == cdm_concept.id)
+            .outerjoin(target_concept, target_concept.id == Mapping.target_id)
+            .outerjoin(Cohort, Cohort.id == target_concept.cohort_id)
+            .where(cdm_concept.source_type == ConceptSource.CDM, cdm_concept.variable.in_(set(variables)))
+            .group_by(cdm_concept.variable, Cohort.name)
+        )
+        result = await self.session.execute(stmt)
+
+        mapping_counts: dict[str, dict[str, int]] = defaultdict(dict)
+        for var, cohort_name, count in result.all():
+            if cohort_name is None:
+                mapping_counts[var]
+            else:
+                mapping_counts[var][cohort_name] = count
+        return mapping_counts
+
+    async def create_import_job(
+        self, job_id: uuid.UUID, upload_type: str, filename: str, path: str, use_copy: bool, rebuild: bool = False
+    ):
+        """Queue an import job for the import workers.
+
+        :param job_id: Id of the job, also used for its rejected rows report.
+        :param upload_type: Type of the uploaded data.
+        :param filename: Name of the uploaded file.
+        :param path: Path of the spooled upload.
+        :param use_copy: Bulk load measurements through COPY instead of INSERT statements.
+        :param rebuild: Replace all data of the upload type with the upload, defaults to False.
+        """
+        self.session.add(
+            ImportJob(
+                id=job_id, upload_type=upload_type, filename=filename, path=path, use_copy=use_copy, rebuild=rebuild
+            )
+        )
+        await self.session.commit()
+
+    async def get_import_job(self, job_id: uuid.UUID) -> Optional[ImportJob]:
+        """Retrieve an import job.
+
+        :param job_id: Id of the job.
+        :return: The job, or None if it does not exist.
+        """
+        return await self.session.get(ImportJob, job_id, populate_existing=True)
+
+    async def claim_import_job(self, stale_after: float) -> Optional[ImportJob]:
+        """Claim the oldest queued import job and mark it as running.
+
+        Jobs are locked with SKIP LOCKED, so concurrent workers never claim the same job. Running jobs whose progress
+        was not updated for `stale_after` seconds are assumed to belong to a worker that died and are claimed again.
+
+        :param stale_after: Seconds after which a running job without progress is claimed again.
+        :return: The claimed job, or None if no job is waiting.
+        """
+        stale = datetime.now(timezone.utc) - timedelta(seconds=stale_after)
+        query = (
+            select(ImportJob)
+            .where(
+                or_(
+                    ImportJob.status == ImportStatus.QUEUED,
+                    (ImportJob.status == ImportStatus.RUNNING) & (ImportJob.updated_at < stale),
                 )
             )
-            result = await self.session.execute(stmt)
-            cdm_concept = result.scalar_one_or_none()
+            .order_by(ImportJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = await self.session.scalar(query)
+        if job is None:
+            await self.session.rollback()
+            return None
+
+        job.status = ImportStatus.RUNNING
+        job.attempts += 1
+        job.files_total = None
+        job.files_done = 0
+        job.current_file = None
+        job.rows_processed = 0
+        job.rows_rejected = 0
+        job.rows_per_second = None
+        job.error = None
+        job.started_at = job.updated_at = func.now()
+        job.finished_at = None
+        await self.session.commit()
+        await self.session.refresh(job)
+        return job
 
-            if not cdm_concept:
-                raise ValueError(f"Requested CDM variable '{var}' does not exist in the database.")
+    async def update_import_job(self, job_id: uuid.UUID, **values):
+        """Record the progress or outcome of an import job.
 
-            mapped_cohort_ids = {
-                m.target.cohort_id for m in cdm_concept.mappings_as_source if m.target and m.target.cohort_id
-            }
+        :param job_id: Id of the job.
+        :param values: Column values to set.
+        """
+        await self.session.execute(
+            update(ImportJob).where(ImportJob.id == job_id).values(updated_at=func.now(), **values)
+        )
+        await self.session.commit()
 
-            for m in cdm_concept.mappings_as_source:
-                if m.target and m.target.cohort:
-                    cohort_stats[m.target.cohort.name]["found"] += 1
+    async def retry_import_job(self, job_id: uuid.UUID):
+        """Queue a failed import job again.
 
-            cohorts = await self.get_cohorts()
-            for cohort in cohorts:
-                if cohort.id not in mapped_cohort_ids:
-                    cohort_stats[cohort.name]["missing"].append(var)
+        :param job_id: Id of the job.
+        """
+        await self.update_import_job(job_id, status=ImportStatus.QUEUED, error=None, finished_at=None)
 
-        # Build DataFrame, skip cohorts with 0 found
-        rows = []
-        for cohort_name, stats in cohort_stats.items():
-            found_count: int = stats["found"]  # type: ignore
-            if found_count == 0:
-                continue  # skip cohorts with 0 availability
+    async def get_import_manifest(self, upload_type: str) -> dict[str, str]:
+        """Get the content hashes of the files the variables or modalities of an upload type were imported from.
 
-            missing_vars = ", ".join(stats["missing"])
-            percentage = round((found_count / total_variables) * 100, 2)
-            found_str = f"{found_count}/{total_variables} ({percentage}%)"
-            rows.append({"cohort": cohort_name, "found": found_str, "missing": missing_vars})
+        :param upload_type: Upload type of the files.
+        :return: Mapping of the variable or modality names to the content hashes.
+        """
+        result = await self.session.execute(
+            select(ImportManifest.name, ImportManifest.content_hash).where(ImportManifest.upload_type == upload_type)
+        )
+        return dict(result.all())
 
-        df = pd.DataFrame(rows)
-        if not df.empty:
-            df.sort_values(by="found", ascending=False, inplace=True)
-            df.reset_index(drop=True, inplace=True)
-        return df
+    async def record_import(self, upload_type: str, name: str, content_hash: str):
+        """Record the content hash of the file a variable or modality was imported from.
 
-    async def clear_all(self):
+        :param upload_type: Upload type of the file.
+        :param name: Name of the variable or modality.
+        :param content_hash: SHA-256 hex digest of the file content.
         """
-        Clear all database tables: vocabularies, concepts, CDMs, and mappings.
+        stmt = pg_insert(ImportManifest).values(upload_type=upload_type, name=name, content_hash=content_hash)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ImportManifest.upload_type, ImportManifest.name],
+            set_={"content_hash": stmt.excluded.content_hash, "imported_at": func.now()},
+        )
+        await self.session.execute(stmt)
+        await self.session.commit()
+
+    @asynccontextmanager
+    async def import_lock(self, upload_type: str) -> AsyncIterator[None]:
+        """Hold the advisory lock of an upload type, so imports of several workers into its tables run one at a time.
+
+        The lock is held by a transaction of a separate connection and released with it, even if the worker dies.
+
+        :param upload_type: Upload type of the import.
         """
         if not self.engine:
-            raise RuntimeError("Engine must be provided during repository initialization to use clear_all()")
-        await self.session.close()
+            raise RuntimeError("Engine must be provided during repository initialization to use import_lock()")
+        async with self.engine.connect() as conn:
+            await conn.execute(select(func.pg_advisory_xact_lock(IMPORT_LOCK_CLASS, func.hashtext(upload_type))))
+            yield
+
+    async def create_shadow_tables(self, upload_type: str) -> str:
+        """Create empty copies of the tables of an upload type in a shadow schema, to rebuild them next to the live ones.
+
+        Leftovers of an earlier rebuild that did not finish are dropped. Tables of other upload types, like the cohorts,
+        are referenced in the live schema.
+
+        :param upload_type: Upload type whose tables are rebuilt.
+        :return: Name of the shadow schema.
+        """
+        if not self.engine:
+            raise RuntimeError("Engine must be provided during repository initialization to use create_shadow_tables()")
+        schema = f"shadow_{upload_type}"
+        table_names = {upload_table.name for upload_table in UPLOAD_TABLES[upload_type]}
+
+        shadow_metadata = MetaData()
+        for model_table in Base.metadata.sorted_tables:
+            model_table.to_metadata(
+                shadow_metadata,
+                schema=schema if model_table.name in table_names else model_table.schema,
+                referred_schema_fn=lambda _, to_schema, constraint, referred_schema: (
+                    to_schema if constraint.referred_table.name in table_names else referred_schema
+                ),
+            )
+
+        async with self.engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+            await conn.execute(text(f"CREATE SCHEMA {schema}"))
+            await conn.run_sync(
+                shadow_metadata.create_all, tables=[shadow_metadata.tables[f"{schema}.{name}"] for name in table_names]
+            )
+        return schema
+
+    async def drop_shadow_tables(self, upload_type: str):
+        """Drop the shadow schema of an upload type after a rebuild failed, the live tables are not affected.
+
+        :param upload_type: Upload type whose tables were rebuilt.
+        """
+        if not self.engine:
+            raise RuntimeError("Engine must be provided during repository initialization to use drop_shadow_tables()")
         async with self.engine.begin() as conn:
-            await conn.run_sync(Base.metadata.drop_all)
-            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS shadow_{upload_type} CASCADE"))
+
+    async def swap_shadow_tables(self, upload_type: str, manifest: dict[str, str]):
+        """Replace the live tables of an upload type by their rebuilt shadow tables in a single short transaction.
+
+        Readers see either the previous or the rebuilt data. The previous tables are dropped afterwards.
+
+        :param upload_type: Upload type whose tables were rebuilt.
+        :param manifest: Content hashes of the files the tables were rebuilt from, by variable or modality name.
+        """
+        if not self.engine:
+            raise RuntimeError("Engine must be provided during repository initialization to use swap_shadow_tables()")
+        shadow, retired = f"shadow_{upload_type}", f"retired_{upload_type}"
+
+        async with self.engine.begin() as conn:
+            live = (await conn.execute(select(func.current_schema()))).scalar_one()
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {retired} CASCADE"))
+            await conn.execute(text(f"CREATE SCHEMA {retired}"))
+            # Moving a table also moves its indexes, constraints and sequences
+            for upload_table in reversed(UPLOAD_TABLES[upload_type]):
+                await conn.execute(text(f"ALTER TABLE {live}.{upload_table.name} SET SCHEMA {retired}"))
+            for upload_table in UPLOAD_TABLES[upload_type]:
+                await conn.execute(text(f"ALTER TABLE {shadow}.{upload_table.name} SET SCHEMA {live}"))
+            await conn.execute(text(f"DROP SCHEMA {shadow}"))
+
+            await conn.execute(delete(ImportManifest).where(ImportManifest.upload_type == upload_type))
+            if manifest:
+                await conn.execute(
+                    pg_insert(ImportManifest),
+                    [
+                        {"upload_type": upload_type, "name": name, "content_hash": content_hash}
+                        for name, content_hash in manifest.items()
+                    ],
+                )
+
+        async with self.engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA {retired} CASCADE"))
+        self._import_cohort_map = None
+        await self.bump_data_generation()
+
+    async def reset(self, upload_type: str) -> bool:
+        """Delete all data of an upload type, keeping the tables with their indexes and statistics.
+
+        The tables are truncated and their ids restart at 1. Resetting the metadata resets all other upload types as
+        well, as their data references the cohorts. The data generation is incremented so cached reads of the deleted
+        data are invalidated.
+
+        :param upload_type: Upload type whose data is deleted.
+        :return: Whether the data was deleted, False if an import of an affected upload type is running.
+        """
+        upload_types = sorted(UPLOAD_TABLES) if upload_type == "metadata" else [upload_type]
+        for reset_type in upload_types:
+            result = await self.session.execute(
+                select(func.pg_try_advisory_xact_lock(IMPORT_LOCK_CLASS, func.hashtext(reset_type)))
+            )
+            if not result.scalar_one():
+                await self.session.rollback()
+                return False
+
+        # Tables referencing the truncated ones are part of the same upload type, so no CASCADE is needed
+        tables = [upload_table.name for reset_type in upload_types for upload_table in UPLOAD_TABLES[reset_type]]
+        await self.session.execute(text(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY"))
+        await self.session.execute(delete(ImportManifest).where(ImportManifest.upload_type.in_(upload_types)))
+        self._import_cohort_map = None
+        await self.bump_data_generation()
+        return True
+
+    async def clear_all(self) -> bool:
+        """
+        Clear all data: cohorts, concepts, mappings, chord diagrams and measurements.
+        The data generation is kept and incremented so cached reads of the cleared data are invalidated,
+        the import jobs are kept as well. Missing tables and indexes are created afterwards, which is cheap on the
+        emptied tables, so a cleared database is on the current schema like a newly created one.
+
+        :return: Whether the data was cleared, False if an import is running.
+        """
+        if not await self.reset("metadata"):
+            return False
+        await self.session.run_sync(lambda session: create_schema(session.connection()))
+        await self.session.commit()
+        return True
 
     async def close(self):
         """
@@ -1,6 +1,15 @@
 from typing import TypedDict
 
+import pandas as pd
+
 
 class CohortStats(TypedDict):
     found: int
     missing: list[str]
+
+
+class ImportStats(TypedDict):
+    inserted: int
+    skipped: int
+    # Rows that were not imported, with their line in the CSV file and the reason
+    rejected: pd.DataFrame
@@ -1,148 +1,140 @@
-import re
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
+from preprocessing.data import variable_file_stem
 
-def extract_variables(
-    df_dict: dict[str, pd.DataFrame], mapping_df: pd.DataFrame
-) -> dict[str, dict[str, list[dict[str, int | float | str]]]]:
-    """Generates a nested dictionary containing measurements and diagnoses for mapped variables across cohorts.
 
-    This function process cohort data and variable mappings to extract relevant measurement and diagnoses
-    for each variable and cohort. The result is a nested dictionary with the following structure:
+COLUMNS = ["participantNumber", "cohort", "measurement", "diagnosis"]
+
 
-    - Outer dictionary keys: Variable names.
-    - Inner dictionary keys: Cohort names.
-    - Inner list items: Dictionaries containing measurements and diagnoses.
+def numeric_variables(cdm: pd.DataFrame) -> pd.DataFrame:
+    """Selects the numeric variables of the CDM, whose measurements are shown as biomarkers.
 
     Args:
-        df_dict (dict[str, pd.DataFrame]): A dictionary where keys are cohort names and values are data frames
-            containing participant-level data for each cohort.
-        mapping_df (pd.DataFrame): A data frame containing mappings of variables to their corresponding cohort terms.
+        cdm (pd.DataFrame): The combined CDM modalities, as returned by `preprocessing.data.load_cdm`.
 
     Returns:
-        dict[str, dict[str, list[dict[str, int | float | str]]]]: A nested dictionary structured as follows:
-            - Outer dictionary:
-                - Keys: Variable names.
-                - Values: Inner dictionaries for each cohort.
-            - Inner dictionary:
-                - Keys: Cohort names.
-                - Values: Lists of dictionaries containing:
-                    - "measurement" (int | float | str): The measured value for the variable.
-                    - "diagnoses" (str): The diagnosis associated with the measurement.
+        pd.DataFrame: The rows of the numeric variables.
     """
+    return cdm.loc[cdm.Rank == 2]
+
 
-    result_dict = {}
+def mapped_columns(mappings: pd.Series) -> pd.Series:
+    """Selects the column of a cohort that each variable is mapped to.
 
-    for variable in mapping_df.Feature:
+    Args:
+        mappings (pd.Series): The column of the mapping data frame for the cohort, indexed by variable.
 
-        # Extract only variable column from PASSIONATE
-        variable_row = mapping_df.loc[mapping_df["Feature"] == variable]
+    Returns:
+        pd.Series: The mapped column of each mapped variable. If the variable mapped to more than one term, the first
+            one is used.
+    """
+    return mappings.dropna().astype(str).str.split(", ").str[0]
 
-        for cohort in mapping_df.columns.intersection(list(df_dict.keys())):
-            feat = variable_row[cohort].item()
 
-            # If the mapping is empty continue
-            if pd.isna(feat):
-                continue
+def extract_cohort_measurements(mappings: pd.Series, cohort: str, data: pd.DataFrame) -> pd.DataFrame | None:
+    """Extracts the measurements and diagnoses of each mapped variable from the baseline visit of a single cohort.
 
-            # If the variable mapped to more than one term, take the first one
-            if ", " in feat:
-                feat = feat.split(", ")[0]
+    All mapped columns of the cohort are selected at once and stacked into a long format with one row per participant
+    that has both a measurement and a diagnosis.
 
-            # The mapped variable might not contain valid measurements
-            # In this case drop the column
-            if feat not in df_dict[cohort].columns:
-                continue
+    Args:
+        mappings (pd.Series): The column of the mapping data frame for the cohort, indexed by variable.
+        cohort (str): The name of the cohort.
+        data (pd.DataFrame): Participant-level data of the baseline visit of the cohort.
 
-            # Filter rows where both the Measurement and the Diagnosis contain valid information.
-            valid_rows = df_dict[cohort][(df_dict[cohort][feat].notna()) & (df_dict[cohort]["Diagnosis"].notna())]
+    Returns:
+        pd.DataFrame | None: The measurements in the format of `extract_variables` with an additional "variable"
+            column, or None if no variable is mapped to the data of the cohort.
+    """
+    features = mapped_columns(mappings)
 
-            if not valid_rows.empty:
-                if variable not in result_dict:
-                    result_dict[variable] = {}
-                if cohort not in result_dict[variable]:
-                    result_dict[variable][cohort] = []
+    # The mapped variable might not contain valid measurements
+    # In this case the column was dropped
+    features = features[features.isin(data.columns)]
+    if features.empty:
+        return None
+    feature_columns = pd.Index(features.unique())
 
-                for _, row in valid_rows.iterrows():
-                    result_dict[variable][cohort].append(
-                        {
-                            "measurement": row[feat],
-                            "diagnosis": row["Diagnosis"],
-                        }
-                    )
+    # Only rows where both the measurement and the diagnosis contain valid information
+    data = data.loc[data["Diagnosis"].notna()]
+    values = data[feature_columns]
 
-    return result_dict
+    # Long format ordered by column and row, participants are numbered per column
+    column_indices, rows = np.nonzero(values.notna().to_numpy().T)
+    stacked = pd.DataFrame(
+        {
+            "column": column_indices,
+            "measurement": values.to_numpy(dtype=object).T[column_indices, rows],
+            "diagnosis": data["Diagnosis"].to_numpy()[rows],
+        }
+    )
+    stacked["participantNumber"] = stacked.groupby("column").cumcount()
 
+    variables = pd.DataFrame({"variable": features.index, "column": feature_columns.get_indexer(features)})
+    return variables.merge(stacked, on="column").assign(cohort=cohort)
 
-# Define the base path
-base_path = Path("backend/data")
 
-### READ CDM MODALITIES ###
-cdm_files = sorted(base_path.glob("cdm/*.csv"))
-modalities = [file.stem for file in cdm_files]  # names of the data frames
-dataframes = [pd.read_csv(file) for file in cdm_files]  # the data frames
+def combine_cohort_measurements(measurements: list[pd.DataFrame | None]) -> dict[str, pd.DataFrame]:
+    """Combines the measurements of `extract_cohort_measurements` into one data frame per variable.
 
-# Create a dictionary with all modalities as dataframes
-all_variables = {modality.lower(): df for modality, df in zip(modalities, dataframes)}
+    Args:
+        measurements (list[pd.DataFrame | None]): The measurements of each cohort, in cohort order.
 
-# Drop irrelevant columns
-for df in all_variables.values():
-    df.drop(columns=["CURIE", "Definition", "Synonyms"], inplace=True, errors="ignore")
+    Returns:
+        dict[str, pd.DataFrame]: The measurements of each variable with at least one measurement.
+    """
+    measurements = [cohort_measurements for cohort_measurements in measurements if cohort_measurements is not None]
+    if not measurements:
+        return {}
 
-# Combine the modalities into a single dataframe
-merged_df = pd.concat(all_variables.values(), ignore_index=True)
+    # Rows of a variable stay in cohort order
+    return {
+        variable: group[COLUMNS].infer_objects().reset_index(drop=True)
+        for variable, group in pd.concat(measurements, ignore_index=True).groupby("variable", sort=False)
+    }
 
-# Replace "No total score." as the test was performed but the total score was not reported
-merged_df.replace({"No total score.": np.nan}, inplace=True)
 
-# Filter numeric variables
-numeric_variables = merged_df.loc[merged_df.Rank == 2]
+def extract_variables(df_dict: dict[str, pd.DataFrame], mapping_df: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """Generates a data frame containing measurements and diagnoses of each mapped variable across cohorts.
 
-### READ PATIENT LEVEL DATA ###
-patient_level_files = sorted(base_path.glob("patient_level/*.csv"))
-cohorts = [file.stem for file in patient_level_files]  # names of the cohorts
-datasets = [pd.read_csv(file, index_col=0, low_memory=False) for file in patient_level_files]  # the actual dataframes
-# Create a dictionary with all cohorts as dataframes
-cohort_studies = {
-    cohort: df.loc[(df["Months"] == 0)] for cohort, df in zip(cohorts, datasets)  # Only utilizing baseline visit
-}
+    This function process cohort data and variable mappings to extract relevant measurement and diagnoses
+    for each variable and cohort, see `extract_cohort_measurements`.
 
-# Drop empty columns from the dataframes
-for cohort, _ in cohort_studies.items():
-    # Please make the patient ID column naming consistent
-    # and set it as the index
-    cohort_studies[cohort].dropna(axis=1, how="all", inplace=True)
+    Args:
+        df_dict (dict[str, pd.DataFrame]): A dictionary where keys are cohort names and values are data frames
+            containing participant-level data for each cohort.
+        mapping_df (pd.DataFrame): A data frame containing mappings of variables to their corresponding cohort terms.
 
-result = extract_variables(cohort_studies, numeric_variables)
+    Returns:
+        dict[str, pd.DataFrame]: A dictionary where:
+            - Keys are the names of variables with at least one measurement.
+            - Values are data frames with the following columns:
+                - "participantNumber" (int): Number of the participant within the cohort.
+                - "cohort" (str): The name of the cohort.
+                - "measurement" (int | float | str): The measured value for the variable.
+                - "diagnosis" (str): The diagnosis associated with the measurement.
+    """
+    mappings = mapping_df.set_index("Feature")
+    return combine_cohort_measurements(
+        [
+            extract_cohort_measurements(mappings[cohort], cohort, df_dict[cohort])
+            for cohort in mapping_df.columns.intersection(list(df_dict.keys()))
+        ]
+    )
 
-# Convert each variable dictionary into a dataframe and save it as csv file
-output_path = base_path / "processed/biomarker"
-output_path.mkdir(parents=True, exist_ok=True)
 
-for variable, variable_data in result.items():
+def write_biomarker_variables(result: dict[str, pd.DataFrame], output_path: Path):
+    """Saves the measurements of each variable in random order as a CSV file named after the variable.
 
-    # Create a list to store the data
-    data = []
-    for cohort, measurements in variable_data.items():
-        for i, measurement in enumerate(measurements):
-            data.append(
-                {
-                    "participantNumber": i,
-                    "cohort": cohort,
-                    "measurement": measurement["measurement"],
-                    "diagnosis": measurement["diagnosis"],
-                }
-            )
-
-    # Create the DataFrame
-    df = pd.DataFrame(data)
-
-    # Check if DataFrame is empty before saving
-    if not df.empty:
-        variable = re.sub(r'[\\/*?:"<>|]', "-", variable)
+    Args:
+        result (dict[str, pd.DataFrame]): The measurements of each variable.
+        output_path (Path): The directory to write the files to, created if missing.
+    """
+    output_path.mkdir(parents=True, exist_ok=True)
+    for variable, df in result.items():
         df = df.sample(frac=1)
         df.set_index(["participantNumber", "cohort"], inplace=True)
-        df.to_csv(output_path / f"{variable}.csv")
+        df.to_csv(output_path / f"{variable_file_stem(variable)}.csv")
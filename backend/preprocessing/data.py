@@ -0,0 +1,144 @@
+import hashlib
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Columns used by all stages besides the mapped variables
+BASE_COLUMNS = ["ID", "Months", "Diagnosis"]
+
+# Columns stored as categories in the cache
+CATEGORICAL_COLUMNS = ["ID", "Diagnosis"]
+
+# Part of the cache key, changed with the layout of the cache files so files of earlier layouts are converted again
+CACHE_FORMAT_VERSION = 2
+
+
+def load_cdm(base_path: Path) -> pd.DataFrame:
+    """Reads the modalities of the PASSIONATE CDM and combines them into a single data frame.
+
+    Args:
+        base_path (Path): The data directory containing the modalities as `cdm/*.csv`.
+
+    Returns:
+        pd.DataFrame: One row per variable with its "Feature", "Rank" and the mappings to each cohort.
+    """
+    cdm_files = sorted(base_path.glob("cdm/*.csv"))
+    dataframes = [pd.read_csv(file) for file in cdm_files]
+
+    # Drop irrelevant columns
+    for df in dataframes:
+        df.drop(columns=["CURIE", "Definition", "Synonyms"], inplace=True, errors="ignore")
+
+    # Combine the modalities into a single dataframe
+    cdm = pd.concat(dataframes, ignore_index=True)
+
+    # Replace "No total score." as the test was performed but the total score was not reported
+    return cdm.replace({"No total score.": np.nan})
+
+
+def cohort_files(base_path: Path) -> dict[str, Path]:
+    """Lists the participant-level data files of the cohorts.
+
+    Args:
+        base_path (Path): The data directory containing the cohorts as `patient_level/*.csv`.
+
+    Returns:
+        dict[str, Path]: The file of each cohort, keyed and sorted by cohort name.
+    """
+    return {file.stem: file for file in sorted(base_path.glob("patient_level/*.csv"))}
+
+
+def _optimize_dtypes(data: pd.DataFrame) -> pd.DataFrame:
+    """Stores IDs and diagnoses as categories and numbers in the smallest type that keeps their values."""
+    for column in data.columns:
+        values = data[column]
+        if column in CATEGORICAL_COLUMNS:
+            data[column] = values.astype("category")
+        elif pd.api.types.is_integer_dtype(values):
+            data[column] = pd.to_numeric(values, downcast="integer")
+        elif pd.api.types.is_float_dtype(values):
+            downcast = values.astype("float32")
+            if ((downcast.astype("float64") == values) | values.isna()).all():
+                data[column] = downcast
+    return data
+
+
+def cache_cohort(path: Path, cache_dir: Path) -> Path:
+    """Converts the participant-level data of a cohort to Parquet, unless it was converted before.
+
+    The cache file is named after the SHA-256 hash of the CSV file and the cache format, so it is converted again
+    whenever the CSV file changes. Cache files of previous versions are removed. All columns of the CSV file are kept,
+    including the first one, which is the unnamed row index in the files of most cohorts.
+
+    Args:
+        path (Path): The CSV file of the cohort.
+        cache_dir (Path): The directory to store the Parquet files in, created if missing.
+
+    Returns:
+        Path: The Parquet file of the cohort, without empty columns.
+    """
+    with open(path, "rb") as f:
+        cache_key = hashlib.file_digest(f, "sha256")
+    cache_key.update(f"format {CACHE_FORMAT_VERSION}".encode())
+    digest = cache_key.hexdigest()
+    cache_file = cache_dir / f"{path.stem}.{digest}.parquet"
+    if cache_file.exists():
+        return cache_file
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    data = pd.read_csv(path, low_memory=False).dropna(axis=1, how="all")
+    # Written under another name first, so an interrupted conversion is not reused
+    partial_file = cache_file.with_suffix(".partial")
+    _optimize_dtypes(data).to_parquet(partial_file, index=False)
+    partial_file.replace(cache_file)
+
+    for stale_file in cache_dir.glob("*.parquet"):
+        if stale_file != cache_file and stale_file.stem.rpartition(".")[0] == path.stem:
+            stale_file.unlink()
+    return cache_file
+
+
+def load_cohort(cache_file: Path, columns: list[str] | None = None) -> pd.DataFrame:
+    """Reads the participant-level data of a cohort from its cache file.
+
+    Args:
+        cache_file (Path): The Parquet file of the cohort, see `cache_cohort`.
+        columns (list[str] | None): The columns to read, by default all. Columns missing from the data are skipped.
+
+    Returns:
+        pd.DataFrame: The data of all visits.
+    """
+    if columns is not None:
+        requested = set(columns)
+        columns = [column for column in pq.read_schema(cache_file).names if column in requested]
+    return pd.read_parquet(cache_file, columns=columns)
+
+
+def baseline_visit(data: pd.DataFrame) -> pd.DataFrame:
+    """Selects the baseline visit from the participant-level data of a cohort.
+
+    Args:
+        data (pd.DataFrame): The data of all visits.
+
+    Returns:
+        pd.DataFrame: The rows of the baseline visit, without columns that are empty at baseline.
+    """
+    return data.loc[data["Months"] == 0].dropna(axis=1, how="all")
+
+
+def variable_file_stem(variable: str) -> str:
+    """Replaces the characters of a variable name that are not allowed in file names.
+
+    The stem is the variable name the written file is imported with, so it is also used when loading the results into
+    the database directly.
+
+    Args:
+        variable (str): The name of the variable.
+
+    Returns:
+        str: The name of the file of the variable, without suffix.
+    """
+    return re.sub(r'[\\/*?:"<>|]', "-", variable)
@@ -1,9 +1,114 @@
-import re
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
+from preprocessing.data import variable_file_stem
+
+
+def _sorted_positions(months: pd.Series) -> np.ndarray:
+    """Positions of months when sorted with sorted(), which places missing months depending on their neighbours."""
+    values = months.tolist()
+    positions = np.empty(len(values), dtype=int)
+    positions[sorted(range(len(values)), key=values.__getitem__)] = np.arange(len(values))
+    return positions
+
+
+COLUMNS = ["months", "patientCount", "totalPatientCount", "cohort"]
+
+
+def prepare_cdm(cdm: pd.DataFrame) -> pd.DataFrame:
+    """Selects the variables of the CDM that are counted over the visits of the cohorts.
+
+    Args:
+        cdm (pd.DataFrame): The combined CDM modalities, as returned by `preprocessing.data.load_cdm`.
+
+    Returns:
+        pd.DataFrame: The CDM indexed by feature, without ignored variables and with unmapped cells set to 0.
+    """
+    cdm = cdm.fillna(0)
+    return cdm.loc[cdm.Rank != 0].set_index("Feature")
+
+
+def mapped_columns(mappings: pd.Series) -> pd.Series:
+    """Selects the column of a cohort that each variable is mapped to.
+
+    Args:
+        mappings (pd.Series): The column of the CDM for the cohort, indexed by variable.
+
+    Returns:
+        pd.Series: The mapped column of each mapped variable.
+    """
+    return mappings[mappings.astype(bool)]
+
+
+def count_cohort_participants(mappings: pd.Series, cohort: str, data: pd.DataFrame) -> pd.DataFrame | None:
+    """Counts the participants recorded for each mapped variable at each visit of a single cohort.
+
+    Args:
+        mappings (pd.Series): The column of the CDM for the cohort, indexed by variable.
+        cohort (str): The name of the cohort.
+        data (pd.DataFrame): Participant-level data of the cohort.
+
+    Returns:
+        pd.DataFrame | None: The counts in the format of `extract_longitudinal_variables` with an additional
+            "variable" column, or None if no variable is mapped to the data of the cohort.
+    """
+    mappings = mapped_columns(mappings)
+    mappings = mappings[mappings.isin(data.columns)]
+    if mappings.empty:
+        return None
+
+    # Missing IDs count as one participant, like unique() did
+    participants, ids = pd.factorize(data["ID"], use_na_sentinel=False)
+    unique_columns = mappings.unique()
+
+    # Long format with one row per recorded value of a mapped column
+    rows, column_indices = np.nonzero(data[unique_columns].notna().to_numpy())
+    recorded = pd.DataFrame(
+        {"column": column_indices, "months": data["Months"].to_numpy()[rows], "participant": participants[rows]}
+    )
+    # Months in order of appearance, as unique() listed them
+    cohort_counts = (
+        recorded.groupby(["column", "months"], dropna=False, sort=False)["participant"]
+        .nunique()
+        .reset_index(name="patientCount")
+    )
+    # Visits without months are listed without participants
+    cohort_counts.loc[cohort_counts["months"].isna(), "patientCount"] = 0
+    cohort_counts["position"] = cohort_counts.groupby("column")["months"].transform(_sorted_positions)
+    cohort_counts = cohort_counts.sort_values(["column", "position"]).drop(columns="position")
+    cohort_counts["column"] = unique_columns[cohort_counts["column"]]
+
+    variables = mappings.rename_axis("variable").reset_index(name="column")
+    return variables.merge(cohort_counts, on="column").assign(totalPatientCount=len(ids), cohort=cohort)
+
+
+def combine_cohort_counts(variables: pd.Index, counts: list[pd.DataFrame | None]) -> dict[str, pd.DataFrame]:
+    """Combines the counts of `count_cohort_participants` into one data frame per variable.
+
+    Args:
+        variables (pd.Index): The variables of the CDM.
+        counts (list[pd.DataFrame | None]): The counts of each cohort, in cohort order.
+
+    Returns:
+        dict[str, pd.DataFrame]: The counts of each variable, empty for variables without counts.
+    """
+    counts = [cohort_counts for cohort_counts in counts if cohort_counts is not None]
+    # Rows of a variable stay in cohort order
+    longitudinal = (
+        {
+            variable: group[COLUMNS].reset_index(drop=True)
+            for variable, group in pd.concat(counts, ignore_index=True).groupby("variable", sort=False)
+        }
+        if counts
+        else {}
+    )
+    return {
+        variable: longitudinal[variable] if variable in longitudinal else pd.DataFrame(columns=COLUMNS)
+        for variable in variables
+    }
+
 
 def extract_longitudinal_variables(
     cdm: pd.DataFrame, participant_data: dict[str, pd.DataFrame]
@@ -42,81 +147,20 @@ def extract_longitudinal_variables(
             "VariableB": ...
         }
     """
-    longitudinal: dict[str, pd.DataFrame] = {}
-    for variable in cdm.index:
-        longitudinal_variable: pd.DataFrame = pd.DataFrame(
-            columns=["months", "patientCount", "totalPatientCount", "cohort"]
-        )
-        for cohort in participant_data:
-            total_participant_count = len(participant_data[cohort].ID.unique())
-            mapping = cdm.loc[variable, cohort]
-            if mapping and mapping in participant_data[cohort].columns:
-                data = participant_data[cohort].loc[:, ["ID", "Months", mapping]]
-                data.dropna(subset=mapping, inplace=True)
-
-                for months in sorted(data.Months.unique().tolist()):
-                    participant_count = len(data.loc[data.Months == months].ID.unique())
-                    longitudinal_variable.loc[len(longitudinal_variable.index)] = [
-                        months,
-                        participant_count,
-                        total_participant_count,
-                        cohort,
-                    ]
-
-        longitudinal[variable] = longitudinal_variable
-
-    return longitudinal
-
-
-# Define the base path
-base_path = Path("backend/data")
-
-### READ CDM MODALITIES ###
-cdm_files = sorted(base_path.glob("cdm/*.csv"))
-modalities = [file.stem for file in cdm_files]
-dataframes = [pd.read_csv(file) for file in cdm_files]
-
-# Create a dictionary with all modalities as dataframes
-all_variables = {modality: df for modality, df in zip(modalities, dataframes)}
-
-# Drop irrelevant columns
-for df in all_variables.values():
-    df.drop(columns=["CURIE", "Definition", "Synonyms"], inplace=True, errors="ignore")
-
-# Combine the modalities into a single dataframe
-cdm = pd.concat(all_variables.values(), ignore_index=True)
-
-# Replace "No total score." as the test was performed but the total score was not reported
-cdm.replace({"No total score.": np.nan}, inplace=True)
-
-# Fill all the NaN cells with 0
-cdm.fillna(0, inplace=True)
-
-# Filter out variables to be ignored
-cdm = cdm.loc[cdm.Rank != 0]
-cdm.set_index("Feature", inplace=True)
-
-### READ PARTICIPANT-LEVEL DATA ###
-participant_level_files = sorted(base_path.glob("patient_level/*.csv"))
-cohorts = [file.stem for file in participant_level_files]
-datasets = [pd.read_csv(file, low_memory=False) for file in participant_level_files]
-
-# Create a dictionary with all cohorts as dataframes
-cohort_studies = {cohort: df for cohort, df in zip(cohorts, datasets)}
-
-# Drop empty columns
-for cohort, df in cohort_studies.items():
-    cohort_studies[cohort].dropna(axis=1, how="all", inplace=True)
-
-longitudinal_variable_data = extract_longitudinal_variables(cdm, cohort_studies)
-
-# Save each variable dataframe as csv file
-output_path = base_path / "processed/longitudinal"
-output_path.mkdir(exist_ok=True)
-
-for variable in longitudinal_variable_data:
-    df = longitudinal_variable_data[variable]
-    if not df.empty:
-        variable = re.sub(r'[\\/*?:"<>|]', "-", variable)
-        df.set_index(["months", "cohort"], inplace=True)
-        df.to_csv(output_path / f"{variable}.csv")
+    return combine_cohort_counts(
+        cdm.index,
+        [count_cohort_participants(cdm[cohort], cohort, data) for cohort, data in participant_data.items()],
+    )
+
+
+def write_longitudinal_variables(longitudinal_variable_data: dict[str, pd.DataFrame], output_path: Path):
+    """Saves each variable with counts as a CSV file named after the variable.
+
+    Args:
+        longitudinal_variable_data (dict[str, pd.DataFrame]): The counts of each variable.
+        output_path (Path): The directory to write the files to, created if missing.
+    """
+    output_path.mkdir(parents=True, exist_ok=True)
+    for variable, df in longitudinal_variable_data.items():
+        if not df.empty:
+            df.set_index(["months", "cohort"]).to_csv(output_path / f"{variable_file_stem(variable)}.csv")
@@ -0,0 +1,248 @@
+import argparse
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+
+from preprocessing.biomarkers import (
+    combine_cohort_measurements,
+    extract_cohort_measurements,
+    numeric_variables,
+    write_biomarker_variables,
+)
+from preprocessing.biomarkers import mapped_columns as biomarker_columns
+from preprocessing.data import (
+    BASE_COLUMNS,
+    baseline_visit,
+    cache_cohort,
+    cohort_files,
+    load_cdm,
+    load_cohort,
+    variable_file_stem,
+)
+from preprocessing.longitudinal import (
+    combine_cohort_counts,
+    count_cohort_participants,
+    prepare_cdm,
+    write_longitudinal_variables,
+)
+from preprocessing.longitudinal import mapped_columns as longitudinal_columns
+
+logger = logging.getLogger("preprocessing")
+logger.setLevel(logging.INFO)
+
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    logger.addHandler(handler)
+
+STAGES = ("biomarkers", "longitudinal")
+
+# Functions selecting the columns of a cohort that each stage reads
+STAGE_COLUMNS = {"biomarkers": biomarker_columns, "longitudinal": longitudinal_columns}
+
+# Directories below the output directory that the results of each stage are written to
+OUTPUT_DIRECTORIES = {"biomarkers": "biomarker", "longitudinal": "longitudinal"}
+
+
+@contextmanager
+def _timed(timings: dict[str, float], stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] += time.perf_counter() - start
+
+
+def _process_cohort(
+    cohort: str, path: Path, cache_dir: Path, mappings: dict[str, pd.Series]
+) -> tuple[dict[str, pd.DataFrame | None], dict[str, float]]:
+    """Runs the stages on a single cohort, so its data is read once and only by one worker.
+
+    Args:
+        cohort (str): The name of the cohort.
+        path (Path): The participant-level data file of the cohort.
+        cache_dir (Path): The directory of the Parquet cache, see `preprocessing.data.cache_cohort`.
+        mappings (dict[str, pd.Series]): The CDM mappings of the cohort for each stage to run.
+
+    Returns:
+        tuple[dict[str, pd.DataFrame | None], dict[str, float]]: The result of each stage for the cohort, and the
+            seconds spent on caching and loading the data and on each stage.
+    """
+    timings = defaultdict(float)
+    results = {}
+    with _timed(timings, "cache"):
+        cache_file = cache_cohort(path, cache_dir)
+    with _timed(timings, "load"):
+        # Only the mapped columns of the stages to run
+        columns = set(BASE_COLUMNS)
+        for stage, stage_mappings in mappings.items():
+            columns.update(STAGE_COLUMNS[stage](stage_mappings))
+        data = load_cohort(cache_file, list(columns))
+    if "biomarkers" in mappings:
+        with _timed(timings, "biomarkers"):
+            results["biomarkers"] = extract_cohort_measurements(mappings["biomarkers"], cohort, baseline_visit(data))
+    if "longitudinal" in mappings:
+        with _timed(timings, "longitudinal"):
+            results["longitudinal"] = count_cohort_participants(mappings["longitudinal"], cohort, data)
+    return results, timings
+
+
+def run_pipeline(
+    data_dir: Path, stages: tuple[str, ...] = STAGES, workers: int | None = None, cache_dir: Path | None = None
+) -> dict[str, dict[str, pd.DataFrame]]:
+    """Runs the preprocessing stages on the CDM and the participant-level data of all cohorts.
+
+    The CDM is read once and the cohorts are processed in parallel, each by a single worker process running all
+    stages on it. The participant-level data is converted to Parquet once and only the mapped columns are read from
+    it. The time spent on each stage is logged.
+
+    Args:
+        data_dir (Path): The data directory containing the CDM modalities and the participant-level data.
+        stages (tuple[str, ...]): The stages to run, out of `STAGES`.
+        workers (int | None): The number of worker processes, by default one per CPU. With 1, the cohorts are
+            processed in the current process.
+        cache_dir (Path | None): The directory of the Parquet cache, by default cache in the data directory.
+
+    Returns:
+        dict[str, dict[str, pd.DataFrame]]: The result of each stage, see `preprocessing.biomarkers.extract_variables`
+            and `preprocessing.longitudinal.extract_longitudinal_variables`.
+    """
+    timings = defaultdict(float)
+    with _timed(timings, "cdm"):
+        cdm = load_cdm(data_dir)
+        stage_mappings = {"biomarkers": numeric_variables(cdm).set_index("Feature"), "longitudinal": prepare_cdm(cdm)}
+
+    files = cohort_files(data_dir)
+    cache_dirs = [cache_dir or data_dir / "cache"] * len(files)
+    cohort_mappings = [
+        {
+            stage: stage_mappings[stage][cohort]
+            for stage in stages
+            # Cohorts without mappings in the CDM are not part of the results
+            if cohort in stage_mappings[stage].columns
+        }
+        for cohort in files
+    ]
+
+    with _timed(timings, "cohorts"):
+        if workers == 1:
+            processed = list(map(_process_cohort, files, files.values(), cache_dirs, cohort_mappings))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                processed = list(executor.map(_process_cohort, files, files.values(), cache_dirs, cohort_mappings))
+
+    # Time spent by the workers, summed over the cohorts
+    for _, cohort_timings in processed:
+        for stage, seconds in cohort_timings.items():
+            timings[stage] += seconds
+
+    results = {}
+    with _timed(timings, "combine"):
+        cohort_results = dict(zip(files, (cohort_result for cohort_result, _ in processed)))
+        if "biomarkers" in stages:
+            # Cohorts in the order of the CDM columns
+            cohorts = stage_mappings["biomarkers"].columns.intersection(list(files))
+            results["biomarkers"] = combine_cohort_measurements(
+                [cohort_results[cohort]["biomarkers"] for cohort in cohorts]
+            )
+        if "longitudinal" in stages:
+            results["longitudinal"] = combine_cohort_counts(
+                stage_mappings["longitudinal"].index,
+                [cohort_result.get("longitudinal") for cohort_result in cohort_results.values()],
+            )
+
+    for stage, seconds in timings.items():
+        logger.info(f"{stage}: {seconds:.2f}s")
+    return results
+
+
+def write_results(results: dict[str, dict[str, pd.DataFrame]], output_dir: Path):
+    """Saves the results of each stage as CSV files, one per variable.
+
+    Args:
+        results (dict[str, dict[str, pd.DataFrame]]): The results of `run_pipeline`.
+        output_dir (Path): The directory to create a directory for each stage in, see `OUTPUT_DIRECTORIES`.
+    """
+    if "biomarkers" in results:
+        write_biomarker_variables(results["biomarkers"], output_dir / OUTPUT_DIRECTORIES["biomarkers"])
+    if "longitudinal" in results:
+        write_longitudinal_variables(results["longitudinal"], output_dir / OUTPUT_DIRECTORIES["longitudinal"])
+
+
+async def load_results(results: dict[str, dict[str, pd.DataFrame]], rebuild: bool = False):
+    """Loads the results of each stage into the database of the API, without writing them to CSV files first.
+
+    Args:
+        results (dict[str, dict[str, pd.DataFrame]]): The results of `run_pipeline`.
+        rebuild (bool): Replace all measurements of each stage instead of only those of the loaded variables.
+    """
+    # Imported here, so the pipeline runs without the configuration of the API
+    from api.dependencies import engine
+    from api.model import UploadType
+    from api.tasks.import_tasks import load_measurements
+    from database.models import create_schema
+
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(create_schema)
+        for stage, measurements in results.items():
+            # Named and skipped like the written CSV files, so the data matches an upload of the files
+            measurements = {variable_file_stem(variable): df for variable, df in measurements.items() if not df.empty}
+            await load_measurements(UploadType(stage), measurements, rebuild)
+    finally:
+        await engine.dispose()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m preprocessing",
+        description="Extract the biomarker measurements and longitudinal participant counts of the cohorts.",
+    )
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=Path("data"),
+        help="directory containing cdm/*.csv and patient_level/*.csv (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--output-dir", type=Path, help="directory to write the results to (default: processed in the data directory)"
+    )
+    parser.add_argument(
+        "--stages", nargs="+", choices=STAGES, default=list(STAGES), help="stages to run (default: all)"
+    )
+    parser.add_argument(
+        "--cache-dir", type=Path, help="directory of the Parquet cache (default: cache in the data directory)"
+    )
+    parser.add_argument(
+        "--load",
+        action="store_true",
+        help="load the results into the database configured for the API instead of writing CSV files",
+    )
+    parser.add_argument(
+        "--rebuild", action="store_true", help="with --load, replace all measurements instead of those of the variables"
+    )
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.rebuild and not args.load:
+        parser.error("--rebuild requires --load")
+
+    start = time.perf_counter()
+    results = run_pipeline(args.data_dir, tuple(args.stages), args.workers, args.cache_dir)
+
+    output_start = time.perf_counter()
+    if args.load:
+        asyncio.run(load_results(results, args.rebuild))
+        logger.info(f"load into database: {time.perf_counter() - output_start:.2f}s")
+    else:
+        write_results(results, args.output_dir or args.data_dir / "processed")
+        logger.info(f"write: {time.perf_counter() - output_start:.2f}s")
+    logger.info(f"total: {time.perf_counter() - start:.2f}s")
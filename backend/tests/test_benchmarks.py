@@ -0,0 +1,76 @@
+"""Benchmarks of the hot read paths against the implementations they replaced.
+
+They take several seconds and are deselected by default, run them with `pytest -m benchmark -s` to see the timings.
+"""
+
+import time
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import select, text
+from sqlalchemy.orm import selectinload
+
+from api.model import LongitudinalData
+from api.responses import rows_response
+from database.models import LongitudinalMeasurement
+
+pytestmark = [pytest.mark.anyio, pytest.mark.benchmark]
+
+ROWS = 100_000
+
+
+@pytest.fixture
+async def longitudinal_rows(engine, cohorts):
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO longitudinal_measurements (variable, months, cohort_id, patient_count, total_patient_count) "
+                f"SELECT 'benchmark', g, c.id, 10, 20 FROM generate_series(1, {ROWS} / 2) g CROSS JOIN cohorts c"
+            )
+        )
+        await conn.execute(text("ANALYZE longitudinal_measurements"))
+
+
+async def _entity_response(session) -> bytes:
+    """Read and serialize the rows like before, as entities with their cohort, validated by the response model."""
+    result = await session.execute(
+        select(LongitudinalMeasurement)
+        .options(selectinload(LongitudinalMeasurement.cohort))
+        .filter(LongitudinalMeasurement.variable == "benchmark")
+    )
+    rows = [
+        {
+            "id": measurement.id,
+            "months": measurement.months,
+            "variable": measurement.variable,
+            "patientCount": measurement.patient_count,
+            "totalPatientCount": measurement.total_patient_count,
+            "cohort": measurement.cohort.name if measurement.cohort else None,
+        }
+        for measurement in result.scalars().all()
+    ]
+    adapter = TypeAdapter(list[LongitudinalData])
+    return JSONResponse(jsonable_encoder(adapter.dump_python(adapter.validate_python(rows)))).body
+
+
+async def _row_response(repository) -> bytes:
+    """Read and serialize the rows like the longitudinal route does."""
+    return rows_response(await repository.get_longitudinal_measurements("benchmark"), LongitudinalData).body
+
+
+async def test_longitudinal_rows_skip_the_per_row_overhead(longitudinal_rows, repository):
+    start = time.perf_counter()
+    expected = await _entity_response(repository.session)
+    timings = {"entities": time.perf_counter() - start}
+    repository.session.expunge_all()
+
+    start = time.perf_counter()
+    body = await _row_response(repository)
+    timings["rows"] = time.perf_counter() - start
+
+    for name, seconds in timings.items():
+        print(f"{name}: {seconds:.2f}s for {ROWS} rows, {seconds / ROWS * 1e6:.1f}us per row")
+    assert body == expected
+    assert timings["rows"] < timings["entities"] / 2
@@ -0,0 +1,32 @@
+import pytest
+
+from database.models import ConceptSource
+from database.postgresql import PostgreSQLRepository
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_cached_reads_outlive_a_failed_request(engine, session_factory, cohorts):
+    # A failed request rolls back its session, which must not break the reads it cached for later requests
+    with pytest.raises(ValueError):
+        async with PostgreSQLRepository(session=session_factory(), engine=engine) as repository:
+            await repository.get_concepts(source_type=ConceptSource.CDM)
+            await repository.rank_cohorts(["does-not-exist"])
+
+    async with PostgreSQLRepository(session=session_factory(), engine=engine) as repository:
+        cohorts = await repository.get_cohorts()
+        concepts = await repository.get_concepts(source_type=ConceptSource.CDM)
+
+    assert sorted((cohort.name, cohort.color) for cohort in cohorts) == [("LuxPARK", "#00ff00"), ("PPMI", "#ff0000")]
+    assert [(concept.variable, concept.source_type) for concept in concepts] == [("Age", ConceptSource.CDM)]
+
+
+async def test_cached_reads_are_immutable(cohorts, repository):
+    cohorts = await repository.get_cohorts()
+    cohort_ids = await repository.get_cohort_ids()
+
+    assert cohorts is await repository.get_cohorts()
+    with pytest.raises(AttributeError):
+        cohorts.append(None)
+    with pytest.raises(TypeError):
+        cohort_ids["LuxPARK"] = 0
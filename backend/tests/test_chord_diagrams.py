@@ -0,0 +1,36 @@
+import pytest
+from sqlalchemy import func, select, text
+
+from database.models import ChordDiagram
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def mappings(engine, cohorts):
+    # The CDM concept 'Age' is mapped to a variable of each cohort
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO concepts (variable, source_type, cohort_id) "
+                "SELECT variable, 'COHORT', id FROM cohorts, (VALUES ('age'), ('age_at_visit')) v (variable) "
+                "WHERE (name, variable) IN (('PPMI', 'age'), ('LuxPARK', 'age_at_visit'))"
+            )
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO mappings (source_id, target_id, modality) "
+                "SELECT cdm.id, study.id, 'Demographics' FROM concepts cdm, concepts study "
+                "WHERE cdm.source_type = 'CDM' AND study.source_type = 'COHORT'"
+            )
+        )
+
+
+async def test_missing_chord_diagram_is_built_without_storing_it(mappings, repository):
+    diagram = await repository.get_chord_diagram("Demographics")
+
+    assert diagram == {
+        "nodes": [{"name": "age", "group": "PPMI"}, {"name": "age_at_visit", "group": "LuxPARK"}],
+        "links": [{"source": "age", "target": "age_at_visit"}],
+    }
+    assert await repository.session.scalar(select(func.count()).select_from(ChordDiagram)) == 0
@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from database.postgresql import PostgreSQLRepository
+
+pytestmark = pytest.mark.anyio
+
+BIOMARKER_CSV = b"participantNumber,cohort,measurement,diagnosis\n1,PPMI,1.5,PD\n2,LuxPARK,2.5,HC\n"
+
+
+async def test_file_repositories_share_the_cohort_map(engine, session_factory, cohorts, statements):
+    async with PostgreSQLRepository(session_factory(), engine) as jobs:
+        cohort_map = await jobs.load_cohort_map()
+
+    for variable in ("MarkerA", "MarkerB"):
+        async with PostgreSQLRepository(session_factory(), cohort_map=cohort_map) as repository:
+            stats = await repository.import_biomarker_measurements(BIOMARKER_CSV, variable)
+        assert stats["inserted"] == 2 and stats["rejected"].empty
+
+    cohort_queries = [statement for statement, _ in statements if statement.startswith("SELECT cohorts.name")]
+    assert len(cohort_queries) == 1
+
+
+def _metadata_csv(*cohorts: str) -> bytes:
+    header = "cohort,participants,healthyControls,prodromalPatients,pdPatients,longitudinalPatients,"
+    header += "followUpInterval,location,doi,link,color\n"
+    return (header + "".join(f"{cohort},10,5,0,5,0,,,,,#000000\n" for cohort in cohorts)).encode()
+
+
+async def test_new_cohorts_clear_the_import_manifest(cohorts, repository):
+    for upload_type in ("metadata", "cdm", "longitudinal", "biomarkers"):
+        await repository.record_import(upload_type, "file", "hash")
+
+    await repository.import_metadata(_metadata_csv("PPMI", "LuxPARK"), replace=True)
+    assert await repository.get_import_manifest("biomarkers") == {"file": "hash"}
+
+    await repository.import_metadata(_metadata_csv("PPMI", "BIOFIND"))
+    for upload_type in ("cdm", "longitudinal", "biomarkers"):
+        assert await repository.get_import_manifest(upload_type) == {}
+    assert await repository.get_import_manifest("metadata") == {"file": "hash"}
+
+
+async def test_load_rejects_missing_columns_before_deleting(cohorts, repository):
+    measurements = pd.DataFrame(
+        {"participantNumber": [1, 2], "cohort": ["PPMI", "LuxPARK"], "measurement": [1.5, 2.5], "diagnosis": "PD"}
+    )
+    await repository.load_biomarker_measurements({"MarkerA": measurements})
+
+    with pytest.raises(ValueError, match="MarkerB"):
+        await repository.load_biomarker_measurements(
+            {"MarkerA": measurements, "MarkerB": measurements.drop(columns="diagnosis")}
+        )
+    await repository.session.rollback()
+
+    assert len(await repository.get_biomarker_measurements("MarkerA")) == 2
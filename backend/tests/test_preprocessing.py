@@ -0,0 +1,37 @@
+import pandas as pd
+
+from preprocessing.biomarkers import extract_cohort_measurements
+from preprocessing.data import BASE_COLUMNS, baseline_visit, cache_cohort, load_cohort
+from preprocessing.longitudinal import count_cohort_participants
+
+
+def test_first_column_reaches_the_cache(tmp_path):
+    # The mapped variable is the first column instead of an unnamed row index
+    path = tmp_path / "Cohort.csv"
+    path.write_text("UPDRS,ID,Months,Diagnosis\n10.5,p1,0,PD\n12.5,p2,0,HC\n11.0,p1,12,PD\n,p2,12,HC\n")
+    mappings = pd.Series({"UPDRS III": "UPDRS"})
+
+    data = load_cohort(cache_cohort(path, tmp_path / "cache"), BASE_COLUMNS + ["UPDRS"])
+    counts = count_cohort_participants(mappings, "Cohort", data)
+    measurements = extract_cohort_measurements(mappings, "Cohort", baseline_visit(data))
+
+    assert list(data.columns) == ["UPDRS", "ID", "Months", "Diagnosis"]
+    assert counts[["variable", "months", "patientCount", "totalPatientCount"]].values.tolist() == [
+        ["UPDRS III", 0, 2, 2],
+        ["UPDRS III", 12, 1, 2],
+    ]
+    assert measurements[["variable", "measurement", "diagnosis"]].values.tolist() == [
+        ["UPDRS III", 10.5, "PD"],
+        ["UPDRS III", 12.5, "HC"],
+    ]
+
+
+def test_cache_is_converted_again_when_the_file_changes(tmp_path):
+    path = tmp_path / "Cohort.csv"
+    path.write_text(",ID,Months,Diagnosis\n0,p1,0,PD\n")
+    first = cache_cohort(path, tmp_path / "cache")
+    path.write_text(",ID,Months,Diagnosis\n0,p1,0,HC\n")
+    second = cache_cohort(path, tmp_path / "cache")
+
+    assert first != second and not first.exists()
+    assert load_cohort(second, BASE_COLUMNS)["Diagnosis"].tolist() == ["HC"]
@@ -0,0 +1,122 @@
+"""Query plan regression tests of the hot read paths.
+
+The statements the repository sends are recorded and explained against synthetic data, so a changed query or
+a dropped index that turns an index lookup into a sequential scan fails here instead of in production.
+"""
+
+import json
+
+import pytest
+from sqlalchemy import text
+
+pytestmark = pytest.mark.anyio
+
+INDEX_SCANS = {"Index Scan", "Index Only Scan", "Bitmap Index Scan"}
+
+SEED = [
+    """
+    INSERT INTO cohorts (name, color)
+    SELECT 'cohort' || c, '#000000' FROM generate_series(1, 3) c
+    """,
+    """
+    INSERT INTO biomarker_measurements (variable, participant_id, cohort_id, measurement, diagnosis)
+    SELECT 'biomarker' || (g % 200), g, c.id, random(), (ARRAY['PD', 'HC', 'Prodromal'])[1 + g % 3]
+    FROM generate_series(1, 100000) g CROSS JOIN cohorts c
+    """,
+    """
+    INSERT INTO longitudinal_measurements (variable, months, cohort_id, patient_count, total_patient_count)
+    SELECT 'variable' || (g % 1000), g / 1000, c.id, 10, 20
+    FROM generate_series(1, 100000) g CROSS JOIN cohorts c
+    """,
+    # Index-only scans are only chosen for pages marked all-visible by VACUUM
+    "VACUUM ANALYZE cohorts",
+    "VACUUM ANALYZE biomarker_measurements",
+    "VACUUM ANALYZE longitudinal_measurements",
+]
+
+
+@pytest.fixture(scope="module")
+async def seeded(engine):
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for statement in SEED:
+            await conn.execute(text(statement))
+    yield
+    async with engine.begin() as conn:
+        await conn.execute(text("TRUNCATE cohorts, biomarker_measurements, longitudinal_measurements CASCADE"))
+
+
+def _scans(plan: dict):
+    """Yield the node type, relation and index of every node of a JSON query plan."""
+    yield plan["Node Type"], plan.get("Relation Name"), plan.get("Index Name")
+    for child in plan.get("Plans", []):
+        yield from _scans(child)
+
+
+async def _explain(engine, statements: list, table: str) -> list[list[tuple]]:
+    """Explain every recorded statement that reads the given table.
+
+    :return: Scanned nodes per statement.
+    """
+    plans = []
+    async with engine.connect() as conn:
+        for statement, parameters in statements:
+            if table not in statement or not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+                continue
+            result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+            plan = result.scalar_one()
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            plans.append(list(_scans(plan[0]["Plan"])))
+    return plans
+
+
+async def _assert_index_plans(engine, statements: list, table: str, index: str, node_types: set[str]):
+    plans = await _explain(engine, statements, table)
+    assert plans, f"no statement read {table}"
+    for scans in plans:
+        assert ("Seq Scan", table, None) not in scans, scans
+        assert any(node in node_types and scan_index == index for node, _, scan_index in scans), scans
+
+
+async def test_biomarker_measurements_use_index(seeded, engine, repository, statements):
+    await repository.get_biomarker_measurements("biomarker7", "cohort1", "PD")
+    await _assert_index_plans(
+        engine, statements, "biomarker_measurements", "ix_biomarker_variable_cohort_diagnosis", INDEX_SCANS
+    )
+
+
+async def test_biomarker_distribution_is_index_only(seeded, engine, repository, statements):
+    await repository.get_biomarker_distribution("biomarker7", "cohort1", "PD", kde_points=16)
+    await _assert_index_plans(
+        engine, statements, "biomarker_measurements", "ix_biomarker_variable_cohort_diagnosis", {"Index Only Scan"}
+    )
+
+
+async def test_cohort_diagnoses_are_index_only(seeded, engine, repository, statements):
+    await repository.get_cohort_diagnoses_for_biomarkers(["biomarker7", "biomarker8"])
+    await _assert_index_plans(
+        engine, statements, "biomarker_measurements", "ix_biomarker_variable_cohort_diagnosis", {"Index Only Scan"}
+    )
+
+
+async def test_biomarker_variables_use_loose_index_scan(seeded, engine, repository, statements):
+    variables = await repository.get_biomarker_variables()
+    assert len(variables) == 200
+    await _assert_index_plans(
+        engine, statements, "biomarker_measurements", "ix_biomarker_variable_cohort_diagnosis", {"Index Only Scan"}
+    )
+
+
+async def test_longitudinal_measurements_use_index(seeded, engine, repository, statements):
+    await repository.get_longitudinal_measurements("variable7", "cohort1")
+    await _assert_index_plans(
+        engine, statements, "longitudinal_measurements", "ix_longitudinal_variable_cohort_months", INDEX_SCANS
+    )
+
+
+async def test_longitudinal_variables_use_loose_index_scan(seeded, engine, repository, statements):
+    variables = await repository.get_longitudinal_measurement_variables()
+    assert len(variables) == 1000
+    await _assert_index_plans(
+        engine, statements, "longitudinal_measurements", "ix_longitudinal_variable_cohort_months", {"Index Only Scan"}
+    )